@@ -1,15 +1,31 @@
 import ast
 from typing import Any, Union
 
-from enums import ErrorCode
+from enums import ErrorCode, VariableTypes
 from errors import SemanticError
-from nodes import Compound, Declaration, DupaCall
-from symbols import ScopedSymbolTable, ProcedureSymbol, VarSymbol
+from nodes import Compound, Declaration, DupaCall, ArrayDeclaration, \
+    ArrayLength, IterFor, DoWhile, ParFor, LazyBody
+from natives import BuiltinRegistry, default_registry
+from symbols import ScopedSymbolTable, ProcedureSymbol, VarSymbol, \
+    NativeProcedureSymbol, ARRAY_TYPE_NAMES
+from visitors import DispatchVisitor
 
+REDUCTION_OPERATORS = {ast.Add: '+', ast.Mult: '*'}
 
-class SemanticAnalyzer(ast.NodeVisitor):
-    def __init__(self):
+
+class SemanticAnalyzer(DispatchVisitor):
+    def __init__(self, builtins: BuiltinRegistry = None, metrics=None,
+                 modules=None, recover: bool = False):
         self.current_scope: Union[ScopedSymbolTable, None] = None
+        self.global_scope: Union[ScopedSymbolTable, None] = None
+        self.builtins = builtins if builtins is not None else default_registry
+        self.metrics = metrics
+        # Module name -> ScopedSymbolTable exported by the module.
+        self.modules = modules if modules is not None else {}
+        # A statement with an error is skipped and analysis goes on, the
+        # errors are collected in ``errors``, see analyze_statement.
+        self.recover = recover
+        self.errors = []
 
     def error(self, error_code, token):
         raise SemanticError(
@@ -18,57 +34,143 @@ class SemanticAnalyzer(ast.NodeVisitor):
             message=f'{error_code.value} -> {token}'
         )
 
+    def analyze_statement(self, node: ast.AST):
+        if not self.recover:
+            self.visit(node)
+            return
+        try:
+            self.visit(node)
+        except SemanticError as e:
+            # Set by a recovering Parser.
+            e.lineno = getattr(node, 'lineno', None)
+            self.errors.append(e)
+
     def visit_Module(self, node: ast.Module) -> Any:
+        self.enter_global_scope()
+        for child in node.body:
+            self.analyze_statement(child)
+        self.leave_global_scope()
+
+    def enter_global_scope(self) -> ScopedSymbolTable:
+        """Open the scope top-level statements are analyzed in.
+
+        Natives are defined in a scope of their own enclosing it, so the
+        program's declarations shadow them.
+        """
         print('ENTER scope: global')
+        builtins_scope = ScopedSymbolTable(scope_name='builtins',
+                                           scope_level=0,
+                                           enclosing_scope=self.current_scope,
+                                           metrics=self.metrics)
+        self.builtins.define_all(builtins_scope)
         global_scope = ScopedSymbolTable(scope_name='global', scope_level=1,
-                                         enclosing_scope=self.current_scope)
+                                         enclosing_scope=builtins_scope,
+                                         metrics=self.metrics)
         self.current_scope = global_scope
-        for child in node.body:
-            self.visit(child)
+        self.global_scope = global_scope
+        return global_scope
 
-        print(global_scope)
-        self.current_scope = self.current_scope.enclosing_scope
+    def leave_global_scope(self):
+        print(self.global_scope)
+        self.current_scope = self.global_scope.enclosing_scope.enclosing_scope
         print('LEAVE scope: global')
 
     def visit_Pass(self, node: ast.Pass) -> Any:
         pass
 
+    def visit_Import(self, node: ast.Import) -> Any:
+        for alias in node.names:
+            module = self.modules.get(alias.name)
+            if module is None:
+                self.error(error_code=ErrorCode.MODULE_NOT_FOUND,
+                           token=alias.name)
+            for symbol in module.procedures():
+                self.current_scope.define_alias(symbol)
+
     def visit_DupaCall(self, node: DupaCall) -> Any:
         proc_symbol: ProcedureSymbol = self.current_scope.lookup(node.func.id)
+        if not isinstance(proc_symbol, ProcedureSymbol):
+            self.error(error_code=ErrorCode.IDENTIFIER_NOT_FOUND,
+                       token=node.func.id)
         if len(proc_symbol.params) != len(node.args):
-            self.error(error_code=ErrorCode.WRONG_PARAM_NUM, token=node)
-        for param_node in node.args:
+            self.error(error_code=ErrorCode.WRONG_PARAM_NUM,
+                       token=node.func.id)
+        for param_symbol, param_node in zip(proc_symbol.params, node.args):
             self.visit(param_node)
+            if self._is_array(param_symbol) and not (
+                    isinstance(param_node, ast.Name) and not self._is_scalar(
+                        self.resolve_variable(param_node))):
+                self.error(error_code=ErrorCode.NOT_AN_ARRAY,
+                           token=getattr(param_node, 'id', param_node))
         node.proc_symbol = proc_symbol
 
+    def resolve_variable(self, node: ast.Name):
+        """Symbol of a variable, its scope level is stored in the node.
+
+        The interpreter finds the variable in the activation record of that
+        level through its display.
+        """
+        var_symbol = self.current_scope.lookup(node.id)
+        if var_symbol is not None:
+            node.scope_level = var_symbol.scope_level
+        return var_symbol
+
+    @staticmethod
+    def _is_array(symbol) -> bool:
+        return symbol.type is not None and symbol.type.name in ARRAY_TYPE_NAMES
+
+    @staticmethod
+    def _is_scalar(symbol) -> bool:
+        return symbol.type is not None and symbol.type.name in (
+            str(VariableTypes.INTEGER), str(VariableTypes.FLOAT))
+
     def visit_FunctionDef(self, node: ast.FunctionDef) -> Any:
         name = node.name
         proc_symbol = ProcedureSymbol(name)
         self.current_scope.define(proc_symbol)
 
+        for param in node.args:
+            param_type = self.current_scope.lookup(str(param.type))
+            proc_symbol.params.append(VarSymbol(param.id, param_type))
+        proc_symbol.returns = node.returns
+        node.proc_symbol = proc_symbol
+
+        if isinstance(node.body, LazyBody):
+            # Analyzed by analyze_body when the function is first called.
+            node.body.scope = self.current_scope
+            node.body.analyzer_options = {'builtins': self.builtins,
+                                          'metrics': self.metrics,
+                                          'modules': self.modules}
+            proc_symbol.body = node.body
+            return
+        self.analyze_body(proc_symbol, node.body)
+
+    def analyze_body(self, proc_symbol: ProcedureSymbol, body: Compound):
+        """Analyze the body of a function in the current scope."""
+        name = proc_symbol.name
         print("ENTER scope: %s" % name)
         procedure_scope = ScopedSymbolTable(scope_name=name,
                                             scope_level=self.current_scope.scope_level + 1,
-                                            enclosing_scope=self.current_scope)
+                                            enclosing_scope=self.current_scope,
+                                            metrics=self.metrics)
         self.current_scope = procedure_scope
 
-        for param in node.args:
-            param_type = self.current_scope.lookup(param.type)
-            param_name = param.id
-            var_symbol = VarSymbol(param_name, param_type)
+        for var_symbol in proc_symbol.params:
             self.current_scope.define(var_symbol)
-            proc_symbol.params.append(var_symbol)
 
-        self.visit(node.body)
+        self.visit(body)
         print(procedure_scope)
         self.current_scope = self.current_scope.enclosing_scope
         print('LEAVE scope: %s' % name)
-        proc_symbol.body = node.body
-        proc_symbol.returns = node.returns
+        proc_symbol.local_names = [symbol.name for symbol in
+                                   procedure_scope.variables()]
+        # Last, other threads test the body for a LazyBody without the
+        # lock of lazy.materialize and then build frames from local_names.
+        proc_symbol.body = body
 
     def visit_Compound(self, node: Compound):
         for child in node.body:
-            self.visit(child)
+            self.analyze_statement(child)
 
     def visit_UnaryOp(self, node: ast.UnaryOp) -> Any:
         self.visit(node.operand)
@@ -81,7 +183,7 @@ class SemanticAnalyzer(ast.NodeVisitor):
         self.visit(node.right)
 
     def visit_Declaration(self, node: Declaration):
-        type_name = node.type
+        type_name = str(node.type)
         type_symbol = self.current_scope.lookup(type_name)
         var_name = node.id
         var_symbol = VarSymbol(var_name, type_symbol)
@@ -92,16 +194,207 @@ class SemanticAnalyzer(ast.NodeVisitor):
 
         self.current_scope.define(var_symbol)
 
+    def visit_ArrayDeclaration(self, node: ArrayDeclaration):
+        self.visit(node.size)
+        self.visit_Declaration(node)
+
     def visit_Assign(self, node: ast.Assign) -> Any:
-        var_name = node.targets[0].id
-        var_symbol = self.current_scope.lookup(var_name)
+        target = node.targets[0]
+        if isinstance(target, ast.Subscript):
+            self.visit(target)
+        else:
+            var_symbol = self.resolve_variable(target)
+            if var_symbol is None:
+                self.error(error_code=ErrorCode.IDENTIFIER_NOT_FOUND,
+                           token=target.id)
+        self.visit(node.value)
+
+    def visit_Subscript(self, node: ast.Subscript) -> Any:
+        var_name = node.value.id
+        var_symbol = self.resolve_variable(node.value)
         if var_symbol is None:
-            raise NameError(repr(var_name))
+            self.error(error_code=ErrorCode.IDENTIFIER_NOT_FOUND,
+                       token=var_name)
+        if self._is_scalar(var_symbol):
+            self.error(error_code=ErrorCode.NOT_AN_ARRAY, token=var_name)
+        self.visit(node.slice)
+
+    def visit_ArrayLength(self, node: ArrayLength) -> Any:
         self.visit(node.value)
 
     def visit_Name(self, node: ast.Name) -> Any:
-        var_name = node.id
-        var_symbol = self.current_scope.lookup(var_name)
+        var_symbol = self.resolve_variable(node)
         if var_symbol is None:
             self.error(error_code=ErrorCode.IDENTIFIER_NOT_FOUND,
-                       token=var_name)
\ No newline at end of file
+                       token=node.id)
+
+    def visit_ParFor(self, node: ParFor) -> Any:
+        var_symbol = self.current_scope.lookup(node.target)
+        if var_symbol is None:
+            self.error(error_code=ErrorCode.IDENTIFIER_NOT_FOUND,
+                       token=node.target)
+        node.scope_level = var_symbol.scope_level
+        self.visit(node.start)
+        self.visit(node.stop)
+        outer_journal = self.current_scope.journal
+        self.current_scope.journal = journal = []
+        try:
+            self.visit(node.body)
+            node.reductions, node.written_arrays, node.shared_reads = \
+                self._loop_dependencies(node)
+        finally:
+            # Variables declared in the body are private to an iteration
+            # and not visible after the loop.
+            self.current_scope.journal = outer_journal
+            self.current_scope.undo(journal)
+        node.private = sorted({name for name, _ in journal})
+
+    def _loop_dependencies(self, node: ParFor):
+        """Check that the iterations of a parfor loop are independent.
+
+        Variables declared in the body are private to an iteration. Shared
+        scalars may only be updated as ``s = s + e`` or ``s = s * e``
+        reductions and are not read otherwise, shared arrays may only be
+        written at the index given by the loop variable. Functions called in
+        the body may not write variables outside of their frames nor read
+        the reductions and written arrays of the loop.
+        """
+        body = node.body
+        private = {child.id for child in ast.walk(body)
+                   if isinstance(child, Declaration)}
+        reductions = {}
+        written = set()
+        # Name nodes read as the accumulator of a reduction.
+        accumulators = set()
+        targets = set()
+
+        for child in ast.walk(body):
+            if isinstance(child, (ast.FunctionDef, ParFor)) and \
+                    child is not body:
+                self.error(error_code=ErrorCode.LOOP_DEPENDENCY,
+                           token=child.__class__.__name__)
+            if isinstance(child, ast.Return):
+                self.error(error_code=ErrorCode.LOOP_DEPENDENCY,
+                           token='return')
+            if isinstance(child, DupaCall):
+                for param_symbol in child.proc_symbol.params:
+                    if self._is_array(param_symbol):
+                        self.error(error_code=ErrorCode.LOOP_DEPENDENCY,
+                                   token=child.func.id)
+            if not isinstance(child, ast.Assign):
+                continue
+            target = child.targets[0]
+            targets.add(id(target))
+            if isinstance(target, ast.Subscript):
+                name = target.value.id
+                targets.add(id(target.value))
+                if name in private:
+                    continue
+                if not (isinstance(target.slice, ast.Name)
+                        and target.slice.id == node.target):
+                    self.error(error_code=ErrorCode.LOOP_DEPENDENCY,
+                               token=name)
+                written.add(name)
+                continue
+            name = target.id
+            if name in private:
+                continue
+            if name == node.target:
+                self.error(error_code=ErrorCode.LOOP_DEPENDENCY, token=name)
+            accumulator = self._accumulator(child.value, name)
+            operator = REDUCTION_OPERATORS.get(child.value.op.__class__) \
+                if accumulator is not None else None
+            if operator is None or reductions.setdefault(
+                    name, operator) != operator:
+                self.error(error_code=ErrorCode.LOOP_DEPENDENCY, token=name)
+            accumulators.add(id(accumulator))
+
+        for child in ast.walk(body):
+            if isinstance(child, ast.Name) and id(child) not in targets \
+                    and id(child) not in accumulators \
+                    and child.id in reductions:
+                self.error(error_code=ErrorCode.LOOP_DEPENDENCY,
+                           token=child.id)
+            if isinstance(child, ast.Subscript) and \
+                    child.value.id in written and not (
+                        isinstance(child.slice, ast.Name)
+                        and child.slice.id == node.target):
+                self.error(error_code=ErrorCode.LOOP_DEPENDENCY,
+                           token=child.value.id)
+
+        shared_reads = self._called_variables(body)
+        if shared_reads is not None:
+            levels = {child.id: child.scope_level
+                      for child in ast.walk(body)
+                      if isinstance(child, ast.Name)
+                      and hasattr(child, 'scope_level')}
+            for name in list(reductions) + list(written):
+                if shared_reads.get(name) == levels[name]:
+                    self.error(error_code=ErrorCode.LOOP_DEPENDENCY,
+                               token=name)
+
+        self._check_loop_exits(body, in_loop=False)
+        return reductions, sorted(written), shared_reads
+
+    def _called_variables(self, body):
+        """Variables outside of their frames read by the functions called
+        in ``body``, directly or through further calls, by scope level.
+
+        None when one of the functions is not analyzed yet, like a lazily
+        parsed one or the function the loop is in.
+        """
+        reads = {}
+        seen = set()
+        pending = [child.proc_symbol for child in ast.walk(body)
+                   if isinstance(child, DupaCall)]
+        while pending:
+            proc_symbol = pending.pop()
+            if id(proc_symbol) in seen or \
+                    isinstance(proc_symbol, NativeProcedureSymbol):
+                continue
+            seen.add(id(proc_symbol))
+            callee_body = proc_symbol.body
+            if callee_body is None or isinstance(callee_body, LazyBody):
+                return None
+            targets = set()
+            for child in ast.walk(callee_body):
+                if isinstance(child, DupaCall):
+                    pending.append(child.proc_symbol)
+                elif isinstance(child, ast.Assign):
+                    target = child.targets[0]
+                    if isinstance(target, ast.Subscript):
+                        target = target.value
+                    targets.add(id(target))
+            for child in ast.walk(callee_body):
+                # Names of called functions have no level.
+                level = getattr(child, 'scope_level', None)
+                if not isinstance(child, ast.Name) or level is None or \
+                        level > proc_symbol.scope_level:
+                    continue
+                if id(child) in targets:
+                    # Every iteration would write it.
+                    self.error(error_code=ErrorCode.LOOP_DEPENDENCY,
+                               token=child.id)
+                reads[child.id] = level
+        return reads
+
+    @staticmethod
+    def _accumulator(value, name: str):
+        """The ``name`` operand of a ``name op e`` or ``e op name`` update."""
+        if not isinstance(value, ast.BinOp):
+            return None
+        for operand, other in ((value.left, value.right),
+                               (value.right, value.left)):
+            if isinstance(operand, ast.Name) and operand.id == name and \
+                    not any(isinstance(child, ast.Name) and child.id == name
+                            for child in ast.walk(other)):
+                return operand
+        return None
+
+    def _check_loop_exits(self, node, in_loop: bool):
+        if isinstance(node, (ast.Break, ast.Continue)) and not in_loop:
+            self.error(error_code=ErrorCode.LOOP_DEPENDENCY,
+                       token=node.__class__.__name__.lower())
+        in_loop = in_loop or isinstance(node, (IterFor, ast.While, DoWhile))
+        for child in ast.iter_child_nodes(node):
+            self._check_loop_exits(child, in_loop)
@@ -0,0 +1,37 @@
+import array
+
+from enums import VariableTypes
+
+TYPECODES = {
+    VariableTypes.INTEGER_ARRAY: 'q',
+    VariableTypes.FLOAT_ARRAY: 'd',
+}
+
+
+def new_array(array_type: VariableTypes, size) -> array.array:
+    """Zero filled array in one contiguous buffer."""
+    if not isinstance(size, int) or size < 0:
+        raise ValueError(f'Invalid array size {size!r}')
+    typecode = TYPECODES[array_type]
+    return array.array(typecode, bytes(size * array.array(typecode).itemsize))
+
+
+def store_element(values: array.array, index, value):
+    if values.typecode == 'q':
+        value = int(value)
+    values[index] = value
+
+
+def copy_arrays(members: dict, memo: dict = None) -> dict:
+    """Copy of ``members`` with every array copied, aliases are preserved."""
+    if memo is None:
+        memo = {}
+    result = {}
+    for name, value in members.items():
+        if isinstance(value, array.array):
+            copied = memo.get(id(value))
+            if copied is None:
+                copied = memo[id(value)] = array.array(value.typecode, value)
+            value = copied
+        result[name] = value
+    return result
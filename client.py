@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+from typing import Union
+
+from server import DEFAULT_HOST, DEFAULT_PORT, MAX_LINE
+
+
+class DupaClient(object):
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 path: str = None):
+        self.host = host
+        self.port = port
+        self.path = path
+        self._ids = itertools.count()
+        self._reader: Union[asyncio.StreamReader, None] = None
+        self._writer: Union[asyncio.StreamWriter, None] = None
+
+    async def connect(self):
+        if self.path is not None:
+            self._reader, self._writer = await asyncio.open_unix_connection(
+                self.path, limit=MAX_LINE)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(
+                self.host, self.port, limit=MAX_LINE)
+        return self
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._writer = None
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def run(self, source: str) -> dict:
+        request = {'id': next(self._ids), 'source': source}
+        self._writer.write(json.dumps(request).encode('utf-8') + b'\n')
+        await self._writer.drain()
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError('server closed the connection')
+        return json.loads(line)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='DUPA server client')
+    arg_parser.add_argument('file', nargs='?',
+                            help='source file, standard input if omitted')
+    arg_parser.add_argument('--host', default=DEFAULT_HOST)
+    arg_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    arg_parser.add_argument('--unix', metavar='PATH')
+    args = arg_parser.parse_args()
+
+    if args.file:
+        with open(args.file) as f:
+            source = f.read()
+    else:
+        source = sys.stdin.read()
+
+    async def run():
+        async with DupaClient(args.host, args.port, args.unix) as client:
+            return await client.run(source)
+
+    response = asyncio.run(run())
+    print(json.dumps(response, indent=2))
+    return 0 if response.get('ok') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
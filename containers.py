@@ -1,4 +1,9 @@
+from collections import ChainMap
+
+
 class ActivationRecord(object):
+    __slots__ = ('name', 'type', 'nesting_level', 'members', 'return_value')
+
     def __init__(self, name, type_of, nesting_level):
         self.name = name
         self.type = type_of
@@ -15,6 +20,13 @@ class ActivationRecord(object):
     def get(self, key):
         return self.members.get(key)
 
+    def fork(self) -> 'ActivationRecord':
+        """Copy of this record sharing its members until they are written."""
+        ar = ActivationRecord(self.name, self.type, self.nesting_level)
+        ar.members = ChainMap({}, self.members)
+        ar.return_value = self.return_value
+        return ar
+
     def __str__(self):
         lines = [
             '{level}: {type} {name}'.format(
@@ -0,0 +1,340 @@
+import ast
+import asyncio
+import itertools
+import time
+from typing import Union
+
+from arrays import new_array, store_element
+from containers import ActivationRecord
+from errors import ReturnedValue, ContinueIteration, BreakIteration
+from interpreter import Interpreter
+from lazy import materialize
+from nodes import Compound, DupaCall, IterFor, DoWhile, ArrayDeclaration, \
+    ArrayLength, LazyBody, ParFor
+from symbols import NativeProcedureSymbol
+
+DEFAULT_STEP_INTERVAL = 1000
+
+# Nodes which either loop or call, only subtrees containing one of them
+# have to be evaluated as generators.
+SUSPENDING_NODES = (DupaCall, IterFor, DoWhile, ast.While, ParFor)
+
+
+class CooperativeInterpreter(Interpreter):
+    """Interpreter whose visitors are generators.
+
+    Loop back-edges and calls are counted as steps and the interpreter
+    suspends (yields) every ``step_interval`` steps. Subtrees without loops
+    and calls are evaluated by the plain recursive visitors.
+    """
+
+    def __init__(self, parser=None, step_interval: int = DEFAULT_STEP_INTERVAL):
+        super(CooperativeInterpreter, self).__init__(parser)
+        self.step_interval = step_interval
+        self.steps = 0
+        self._next_yield = step_interval
+        self._suspends = {}
+
+    def suspends(self, node) -> bool:
+        result = self._suspends.get(node)
+        if result is None:
+            result = isinstance(node, SUSPENDING_NODES) or any(
+                self.suspends(child) for child in ast.iter_child_nodes(node))
+            self._suspends[node] = result
+        return result
+
+    def gvisit(self, node):
+        method = self.lookup(node.__class__, 'gen_', None)
+        if method is None or not self.suspends(node):
+            return self._gen_sync(node)
+        return method(self, node)
+
+    def _gen_sync(self, node):
+        return self.visit(node)
+        yield  # noqa, makes this function a generator
+
+    def gen_Module(self, node: ast.Module):
+        ar = self.enter_program()
+        for child in node.body:
+            yield from self.gvisit(child)
+        self.leave_frame(ar, None)
+        self.drop_temporaries(ar)
+        return ar
+
+    def gen_Compound(self, node: Compound):
+        for child in node.body:
+            yield from self.gvisit(child)
+
+    def gen_BinOp(self, node: ast.BinOp):
+        left = yield from self.gvisit(node.left)
+        right = yield from self.gvisit(node.right)
+        if isinstance(node.op, ast.Add):
+            return left + right
+        if isinstance(node.op, ast.Sub):
+            return left - right
+        if isinstance(node.op, ast.Mult):
+            return left * right
+        if isinstance(node.op, ast.Div):
+            return left / right
+
+    def gen_UnaryOp(self, node: ast.UnaryOp):
+        operand = yield from self.gvisit(node.operand)
+        if isinstance(node.op, ast.UAdd):
+            return +operand
+        if isinstance(node.op, ast.USub):
+            return -operand
+
+    def gen_Assign(self, node: ast.Assign):
+        target = node.targets[0]
+        if isinstance(target, ast.Subscript):
+            values = self.visit(target.value)
+            index = yield from self.gvisit(target.slice)
+            value = yield from self.gvisit(node.value)
+            store_element(values, index, value)
+            return
+        value = yield from self.gvisit(node.value)
+        self.display[target.scope_level][target.id] = value
+
+    def gen_ArrayDeclaration(self, node: ArrayDeclaration):
+        size = yield from self.gvisit(node.size)
+        self.call_stack.peek()[node.id] = new_array(node.type, size)
+
+    def gen_Subscript(self, node: ast.Subscript):
+        values = self.visit(node.value)
+        index = yield from self.gvisit(node.slice)
+        return values[index]
+
+    def gen_ArrayLength(self, node: ArrayLength):
+        values = yield from self.gvisit(node.value)
+        return len(values)
+
+    def gen_Return(self, node: ast.Return):
+        value = yield from self.gvisit(node.value)
+        self.call_stack.peek().return_value = value
+        raise ReturnedValue()
+
+    def gen_If(self, node: ast.If):
+        test = yield from self.gvisit(node.test)
+        if test:
+            return (yield from self.gvisit(node.body))
+        elif node.orelse is not None:
+            return (yield from self.gvisit(node.orelse))
+
+    def gen_DupaCall(self, node: DupaCall):
+        proc_symbol = node.proc_symbol
+        arguments = []
+        for argument_node in node.args:
+            arguments.append((yield from self.gvisit(argument_node)))
+        if isinstance(proc_symbol, NativeProcedureSymbol):
+            return proc_symbol.invoke(arguments)
+        if proc_symbol.body.__class__ is LazyBody:
+            materialize(proc_symbol)
+        ar = self.make_frame(proc_symbol, arguments)
+
+        self.steps += 1
+        if self.steps >= self._next_yield:
+            self._next_yield = self.steps + self.step_interval
+            yield
+
+        saved = self.enter_frame(ar)
+        return_value = None
+        try:
+            yield from self.gvisit(proc_symbol.body)
+        except ReturnedValue:
+            return_value = ar.return_value
+            if proc_symbol.returns is None:
+                raise RuntimeError("Unexpected return")
+        else:
+            if proc_symbol.returns is not None:
+                raise RuntimeError("Return not found")
+        self.leave_frame(ar, saved)
+        self.frame_pool.release(proc_symbol, ar)
+        return return_value
+
+    def gen_IterFor(self, node: IterFor):
+        yield from self.gvisit(node.expr1)
+        while (yield from self.gvisit(node.expr2)):
+            try:
+                yield from self.gvisit(node.body)
+            except BreakIteration:
+                break
+            except ContinueIteration:
+                pass
+            yield from self.gvisit(node.expr3)
+            self.steps += 1
+            if self.steps >= self._next_yield:
+                self._next_yield = self.steps + self.step_interval
+                yield
+
+    def gen_While(self, node: ast.While):
+        while (yield from self.gvisit(node.test)):
+            try:
+                yield from self.gvisit(node.body)
+            except BreakIteration:
+                break
+            except ContinueIteration:
+                pass
+            self.steps += 1
+            if self.steps >= self._next_yield:
+                self._next_yield = self.steps + self.step_interval
+                yield
+
+    def gen_DoWhile(self, node: DoWhile):
+        while True:
+            try:
+                yield from self.gvisit(node.body)
+            except BreakIteration:
+                break
+            except ContinueIteration:
+                pass
+            if not (yield from self.gvisit(node.test)):
+                break
+            self.steps += 1
+            if self.steps >= self._next_yield:
+                self._next_yield = self.steps + self.step_interval
+                yield
+
+    def gen_ParFor(self, node: ParFor):
+        # Runs serially, a loop running in worker processes could not be
+        # suspended.
+        start = yield from self.gvisit(node.start)
+        stop = yield from self.gvisit(node.stop)
+        ar = self.display[node.scope_level]
+        for index in range(start, stop):
+            ar[node.target] = index
+            yield from self.gvisit(node.body)
+            self.steps += 1
+            if self.steps >= self._next_yield:
+                self._next_yield = self.steps + self.step_interval
+                yield
+        self.drop_private(node)
+        ar[node.target] = max(start, stop)
+
+
+class ProgramTask(object):
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    FINISHED = 'FINISHED'
+    FAILED = 'FAILED'
+
+    def __init__(self, name: str, tree: ast.Module, step_interval: int):
+        self.name = name
+        self.tree = tree
+        self.interpreter = CooperativeInterpreter(step_interval=step_interval)
+        self.state = self.PENDING
+        self.slices = 0
+        self.cpu_time = 0.0
+        self.max_slice_time = 0.0
+        self.started_at: Union[float, None] = None
+        self.finished_at: Union[float, None] = None
+        self.result: Union[ActivationRecord, None] = None
+        self.error: Union[BaseException, None] = None
+
+    @property
+    def steps(self) -> int:
+        return self.interpreter.steps
+
+    def progress(self) -> dict:
+        return {
+            'name': self.name,
+            'state': self.state,
+            'steps': self.steps,
+            'slices': self.slices,
+            'cpu_time': self.cpu_time,
+            'max_slice_time': self.max_slice_time,
+            'call_depth': len(self.interpreter.call_stack.items),
+        }
+
+    async def run(self):
+        generator = self.interpreter.gvisit(self.tree)
+        self.state = self.RUNNING
+        self.started_at = time.perf_counter()
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    next(generator)
+                except StopIteration as e:
+                    self.result = e.value
+                    self.state = self.FINISHED
+                    return self.result
+                finally:
+                    elapsed = time.perf_counter() - start
+                    self.slices += 1
+                    self.cpu_time += elapsed
+                    if elapsed > self.max_slice_time:
+                        self.max_slice_time = elapsed
+                await asyncio.sleep(0)
+        except Exception as e:
+            self.error = e
+            self.state = self.FAILED
+            raise
+        finally:
+            self.finished_at = time.perf_counter()
+
+
+def jain_index(values) -> float:
+    values = list(values)
+    if not values:
+        return 1.0
+    total = sum(values)
+    squares = sum(value * value for value in values)
+    if squares == 0:
+        return 1.0
+    return total * total / (len(values) * squares)
+
+
+class Scheduler(object):
+    """Interleaves many DUPA programs on a single event loop.
+
+    Every program gets its own ``CooperativeInterpreter`` and therefore its
+    own ``CallStack``; analyzed trees are only read and may be shared.
+    """
+
+    def __init__(self, step_interval: int = DEFAULT_STEP_INTERVAL):
+        self.step_interval = step_interval
+        self.tasks = []
+        self._names = itertools.count()
+
+    def spawn(self, tree: ast.Module, name: str = None) -> ProgramTask:
+        if name is None:
+            name = f'program-{next(self._names)}'
+        task = ProgramTask(name, tree, self.step_interval)
+        self.tasks.append(task)
+        return task
+
+    async def run(self, return_exceptions: bool = True):
+        pending = [task for task in self.tasks
+                   if task.state == ProgramTask.PENDING]
+        return await asyncio.gather(*(task.run() for task in pending),
+                                    return_exceptions=return_exceptions)
+
+    def progress(self):
+        return [task.progress() for task in self.tasks]
+
+    def fairness(self) -> dict:
+        """Fairness of the CPU time handed out so far.
+
+        The Jain index is computed over tasks which are still running, or
+        over all tasks once everything is finished, 1.0 meaning every task
+        got the same share.
+        """
+        running = [task for task in self.tasks
+                   if task.state == ProgramTask.RUNNING]
+        sample = running or self.tasks
+        return {
+            'tasks': len(self.tasks),
+            'running': len(running),
+            'jain_cpu_time': jain_index(task.cpu_time for task in sample),
+            'jain_steps': jain_index(task.steps for task in sample),
+            'max_slice_time': max((task.max_slice_time for task in sample),
+                                  default=0.0),
+        }
+
+
+def run_programs(trees, step_interval: int = DEFAULT_STEP_INTERVAL):
+    scheduler = Scheduler(step_interval)
+    for tree in trees:
+        scheduler.spawn(tree)
+    asyncio.run(scheduler.run())
+    return scheduler
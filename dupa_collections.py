@@ -1,3 +1,7 @@
+from containers import ActivationRecord
+from enums import ARType
+
+
 class Stack(object):
     def __init__(self):
         self.items = []
@@ -19,4 +23,55 @@ class CallStack(Stack):
         return s
 
     def __repr__(self):
-        return self.__str__()
\ No newline at end of file
+        return self.__str__()
+
+
+class FramePool(object):
+    """Free-lists of activation records, one per procedure.
+
+    A frame's members dict is created once with a slot for every parameter
+    and local of its procedure and reset in place when the frame is
+    released, so steady state calls allocate neither records nor dicts.
+    """
+
+    def __init__(self):
+        self.allocated = 0
+        self.reused = 0
+        self._free = {}
+
+    def acquire(self, proc_symbol) -> ActivationRecord:
+        free = self._free.get(proc_symbol)
+        if free:
+            self.reused += 1
+            return free.pop()
+        self.allocated += 1
+        ar = ActivationRecord(
+            name=proc_symbol.name,
+            type_of=ARType.PROCEDURE,
+            nesting_level=proc_symbol.scope_level + 1
+        )
+        ar.members = dict.fromkeys(proc_symbol.local_names)
+        return ar
+
+    def release(self, proc_symbol, ar: ActivationRecord):
+        members = ar.members
+        if len(members) != len(proc_symbol.local_names):
+            # Names outside of the procedure's scope were stored in it.
+            members.clear()
+        for name in proc_symbol.local_names:
+            members[name] = None
+        ar.return_value = None
+        free = self._free.get(proc_symbol)
+        if free is None:
+            free = self._free[proc_symbol] = []
+        free.append(ar)
+
+    def stats(self) -> dict:
+        calls = self.allocated + self.reused
+        return {
+            'calls': calls,
+            'allocated': self.allocated,
+            'reused': self.reused,
+            'allocations_per_call': self.allocated / calls if calls else 0.0,
+            'free': sum(len(free) for free in self._free.values()),
+        }
@@ -3,15 +3,46 @@ import inspect
 from typing import Union
 
 from enums import ErrorCode, TokenType, VariableTypes
-from errors import ParserError
-from nodes import Compound, Declaration, Param, DupaCall, IterFor, DoWhile
+from errors import LexerError, ParserError
+from hashcons import InternTable
+from nodes import Compound, Declaration, Param, DupaCall, IterFor, DoWhile, \
+    ArrayDeclaration, ArrayLength, ParFor, LazyBody
 from tokens import Token
 
+# Binding power and node of every infix operator, operators with higher
+# binding power bind tighter and equal ones associate to the left.
+BINARY_OPERATORS = {
+    TokenType.PLUS: (10, ast.Add),
+    TokenType.MINUS: (10, ast.Sub),
+    TokenType.MUL: (20, ast.Mult),
+    TokenType.DIV: (20, ast.Div),
+}
+
+# Prefix operators apply to a single factor.
+PREFIX_OPERATORS = {
+    TokenType.PLUS: ast.UAdd,
+    TokenType.MINUS: ast.USub,
+}
+
 
 class Parser(object):
-    def __init__(self, lexer):
+    def __init__(self, lexer, metrics=None, lazy_functions: bool = False,
+                 hash_cons: bool = False, recover: bool = False):
         self.lexer = lexer
+        self.metrics = metrics
+        # After an error the statement is skipped and parsing goes on, the
+        # errors are collected in ``errors``, see synchronize.
+        self.recover = recover
+        self.errors = []
+        # Function bodies are only brace-matched, see LazyBody.
+        self.lazy_functions = lazy_functions
+        # One table per function being parsed, equal expressions of a
+        # function are shared, see InternTable.
+        self.intern_tables = [InternTable()] if hash_cons else None
+        # Parfor bodies are checked for dependencies by node identity.
+        self.interning_paused = 0
         self.current_token: Union[Token, None] = self.lexer.get_next_token()
+        self.next_token: Union[Token, None] = None
 
     def error(self, error_code: ErrorCode, token: Token):
         print(str(error_code))
@@ -21,9 +52,78 @@ class Parser(object):
             message=f'{str(error_code.value)} -> {str(token)}',
         )
 
+    def synchronize(self, error: Union[LexerError, ParserError]):
+        """Record an error and skip the rest of the statement it is in.
+
+        Tokens are skipped up to and including the next SEMI or up to the
+        RBR closing the enclosing block, blocks opened on the way are
+        skipped whole.
+        """
+        self.errors.append(error)
+        if isinstance(error, LexerError):
+            token_type = self.current_token.token_type
+            self.skip_character()
+            if token_type in (TokenType.SEMI, TokenType.RBR):
+                # The statement ended before the bad character.
+                return
+        depth = 0
+        while self.current_token.token_type != TokenType.EOF:
+            token_type = self.current_token.token_type
+            if token_type == TokenType.RBR and not depth:
+                return
+            try:
+                self.eat(token_type)
+            except LexerError as e:
+                # The token was eaten, only the one after it is lost.
+                self.errors.append(e)
+                self.skip_character()
+            if token_type == TokenType.LBR:
+                depth += 1
+            elif token_type == TokenType.RBR:
+                depth -= 1
+                if not depth:
+                    return
+            elif token_type == TokenType.SEMI and not depth:
+                return
+
+    def skip_character(self):
+        """Go on lexing after the character a LexerError was raised on.
+
+        The current token is replaced: it was either eaten already, or is
+        the ID a failed peek looked past, which is in the skipped statement.
+        Characters failing in a row are reported one by one.
+        """
+        while True:
+            # The lexer stays on the character it failed on.
+            self.lexer.advance()
+            self.next_token = None
+            try:
+                self.current_token = self.lexer.get_next_token()
+                return
+            except LexerError as e:
+                self.errors.append(e)
+
+    def intern(self, node):
+        if self.intern_tables is None or self.interning_paused:
+            return node
+        shared = self.intern_tables[-1].intern(node)
+        if shared is not node and self.metrics is not None:
+            self.metrics.inc('nodes_shared')
+        return shared
+
+    def peek(self) -> Token:
+        """The token after the current one."""
+        if self.next_token is None:
+            self.next_token = self.lexer.get_next_token()
+        return self.next_token
+
     def eat(self, token_type):
         if self.current_token.token_type == token_type:
-            self.current_token = self.lexer.get_next_token()
+            if self.next_token is not None:
+                self.current_token = self.next_token
+                self.next_token = None
+            else:
+                self.current_token = self.lexer.get_next_token()
         else:
             self.error(
                 error_code=ErrorCode.UNEXPECTED_TOKEN,
@@ -34,6 +134,15 @@ class Parser(object):
         """program: statement_list"""
         print("BEGIN PRORGRAM")
         nodes = self.statement_list()
+        while self.recover and self.current_token.token_type == TokenType.RBR:
+            # A block closed more often than opened.
+            try:
+                self.error(error_code=ErrorCode.UNEXPECTED_TOKEN,
+                           token=self.current_token)
+            except ParserError as e:
+                self.errors.append(e)
+            self.eat(TokenType.RBR)
+            nodes += self.statement_list()
         print("END PRGORAM")
         return ast.Module(body=nodes)
 
@@ -41,28 +150,68 @@ class Parser(object):
         """statement_list: statement
                          | compound_statement
                          | function_definition
+                         | import_statement
                          | statement statement_list
                          | compound_statement statement_list
                          | function_definition statement_list
+                         | import_statement statement_list
                          | nothing"""
         print("BEGIN statement_list")
         nodes = []
-        if self.current_token.token_type == TokenType.LBR:
-            nodes += [self.compound_statement()] + self.statement_list()
-        elif self.current_token.token_type == TokenType.DEF:
-            nodes += [self.function_definition()] + self.statement_list()
-        elif self.current_token.token_type in (TokenType.RBR, TokenType.EOF):
-            pass
+        token = self.current_token
+        if token.token_type in (TokenType.RBR, TokenType.EOF):
+            print("END statement_list")
+            return nodes
+        try:
+            if token.token_type == TokenType.LBR:
+                node = self.compound_statement()
+            elif token.token_type == TokenType.DEF:
+                node = self.function_definition()
+            elif token.token_type == TokenType.IMPORT:
+                node = self.import_statement()
+            else:
+                node = self.statement()
+                # if self.current_token.token_type == TokenType.SEMI:
+                #     self.eat(TokenType.SEMI)
+        except (LexerError, ParserError) as e:
+            if not self.recover:
+                raise
+            self.synchronize(e)
         else:
-            node = self.statement()
-            # if self.current_token.token_type == TokenType.SEMI:
-            #     self.eat(TokenType.SEMI)
-            nodes += [node] + self.statement_list()
-            #else:
-            #    nodes += [node]
+            if self.recover:
+                # Semantic errors are reported at the line of the statement.
+                node.lineno = token.lineno
+            nodes.append(node)
+        nodes += self.statement_list()
         print("END statement_list")
         return nodes
 
+    def iter_program(self):
+        """Yield the top-level statements of the program one at a time.
+
+        Every statement is yielded as soon as it is parsed, unlike with
+        program the statements before it are not kept.
+        """
+        print("BEGIN iter_program")
+        while self.current_token.token_type != TokenType.EOF:
+            token_type = self.current_token.token_type
+            if token_type == TokenType.LBR:
+                node = self.compound_statement()
+            elif token_type == TokenType.DEF:
+                node = self.function_definition()
+            elif token_type == TokenType.IMPORT:
+                node = self.import_statement()
+            elif token_type == TokenType.RBR:
+                self.error(error_code=ErrorCode.UNEXPECTED_TOKEN,
+                           token=self.current_token)
+            else:
+                node = self.statement()
+            if self.metrics is not None:
+                self.metrics.inc('nodes_parsed',
+                                 sum(1 for _ in ast.walk(node)))
+            yield node
+        print("END iter_program")
+
     def compound_statement(self):
         """compound_statement: LBR statement_list RBR"""
         print("BEGIN compound_statement")
@@ -74,45 +223,74 @@ class Parser(object):
         print("END compound_statement")
         return root
 
+    def lazy_compound_statement(self):
+        """lazy_compound_statement: LBR <anything with balanced braces> RBR"""
+        token = self.current_token
+        if token.token_type != TokenType.LBR or self.next_token is not None:
+            self.error(error_code=ErrorCode.UNEXPECTED_TOKEN, token=token)
+        end = self.lexer.skip_block()
+        if end is None:
+            self.current_token = self.lexer.get_next_token()
+            self.error(error_code=ErrorCode.UNEXPECTED_TOKEN,
+                       token=self.current_token)
+        self.current_token = self.lexer.get_next_token()
+        return LazyBody(self.lexer.text, token.offset, end)
+
     def statement(self):
-        """statement: assigment_statement SEMI
-                    | declaration_statement SEMI
-                    | empty
-                    | proccall_statement SEMI
-                    | return_statement SEMI
-                    | break_statement SEMI
-                    | continue_statement SEMI
+        """statement: simple_statement SEMI
                     | conditional_statement
                     | loop_statement"""
         print("BEGIN statement")
+        if self.current_token.token_type == TokenType.IF:
+            node = self.conditional_statement()
+        elif self.current_token.token_type in (TokenType.FOR, TokenType.WHILE,
+                                               TokenType.DO, TokenType.PARFOR):
+            node = self.loop_statement()
+        else:
+            node = self.simple_statement()
+            self.eat(TokenType.SEMI)
+        print("END statement")
+        return node
+
+    def simple_statement(self):
+        """simple_statement: assigment_statement
+                           | declaration_statement
+                           | proccall_statement
+                           | return_statement
+                           | break_statement
+                           | continue_statement
+                           | empty"""
+        print("BEGIN simple_statement")
         node = None
-        if self.current_token.token_type == TokenType.ID and self.lexer.current_char == '(':
+        if self.current_token.token_type == TokenType.ID and \
+                self.peek().token_type == TokenType.LPAR:
             node = self.proccall_statement()
         elif self.current_token.token_type == TokenType.ID:
             node = self.assigment_statement()
-            self.eat(TokenType.SEMI)
         elif self.current_token.token_type in (
                 TokenType.VAR, TokenType.INT, TokenType.FLOAT):
             node = self.declaration_statement()
-            self.eat(TokenType.SEMI)
         elif self.current_token.token_type == TokenType.RETURN:
             node = self.return_statement()
-            self.eat(TokenType.SEMI)
-        elif self.current_token.token_type == TokenType.IF:
-            node = self.conditional_statement()
-        elif self.current_token.token_type in (TokenType.FOR, TokenType.WHILE, TokenType.DO):
-            node = self.loop_statement()
         elif self.current_token.token_type == TokenType.BREAK:
             node = self.break_statement()
-            self.eat(TokenType.SEMI)
         elif self.current_token.token_type == TokenType.CONTINUE:
             node = self.continue_statement()
-            self.eat(TokenType.SEMI)
         else:
             node = self.empty()
-        print("END statement")
+        print("END simple_statement")
         return node
 
+    def import_statement(self):
+        """import_statement: IMPORT ID SEMI"""
+        print("BEGIN import_statement")
+        self.eat(TokenType.IMPORT)
+        name = self.current_token.value
+        self.eat(TokenType.ID)
+        self.eat(TokenType.SEMI)
+        print("END import_statement")
+        return ast.Import(names=[ast.alias(name=name)])
+
     def function_definition(self):
         """function_definition:
         DEF (INT | FLOAT | VAR | empty) ID LPAR arguments RPAR compound_statement"""
@@ -134,7 +312,16 @@ class Parser(object):
         self.eat(TokenType.LPAR)
         arguments = self.arguments()
         self.eat(TokenType.RPAR)
-        body = self.compound_statement()
+        if self.lazy_functions:
+            body = self.lazy_compound_statement()
+        elif self.intern_tables is not None:
+            self.intern_tables.append(InternTable())
+            try:
+                body = self.compound_statement()
+            finally:
+                self.intern_tables.pop()
+        else:
+            body = self.compound_statement()
         print("END function_definition")
         return ast.FunctionDef(name=name, args=arguments, body=body, returns=return_type)
 
@@ -153,17 +340,29 @@ class Parser(object):
             return args
 
     def argument(self):
-        """argument: (INT | FLOAT | VAR) ID"""
+        """argument: (INT | FLOAT) (LSQB RSQB)? ID | VAR ID"""
         print("BEGIN argument")
         if self.current_token.token_type == TokenType.VAR:
             self.eat(TokenType.VAR)
             node = Param(self.current_token.value, VariableTypes.UNIVERSAL)
         elif self.current_token.token_type == TokenType.INT:
             self.eat(TokenType.INT)
-            node = Param(self.current_token.value, VariableTypes.INTEGER)
+            if self.current_token.token_type == TokenType.LSQB:
+                self.eat(TokenType.LSQB)
+                self.eat(TokenType.RSQB)
+                node = Param(self.current_token.value,
+                             VariableTypes.INTEGER_ARRAY)
+            else:
+                node = Param(self.current_token.value, VariableTypes.INTEGER)
         elif self.current_token.token_type == TokenType.FLOAT:
             self.eat(TokenType.FLOAT)
-            node = Param(self.current_token.value, VariableTypes.FLOAT)
+            if self.current_token.token_type == TokenType.LSQB:
+                self.eat(TokenType.LSQB)
+                self.eat(TokenType.RSQB)
+                node = Param(self.current_token.value,
+                             VariableTypes.FLOAT_ARRAY)
+            else:
+                node = Param(self.current_token.value, VariableTypes.FLOAT)
         else:
             self.error(error_code=ErrorCode.UNEXPECTED_TOKEN,
                        token=self.current_token)
@@ -183,7 +382,7 @@ class Parser(object):
         return node
 
     def declaration_statement(self):
-        """declaration_statement: (INT | FLOAT | VAR) ID"""
+        """declaration_statement: (INT | FLOAT) (LSQB expr RSQB)? ID | VAR ID"""
         print("BEGIN declaration_statement")
         if self.current_token.token_type == TokenType.VAR:
             self.eat(TokenType.VAR)
@@ -191,86 +390,92 @@ class Parser(object):
                                VariableTypes.UNIVERSAL)
         elif self.current_token.token_type == TokenType.INT:
             self.eat(TokenType.INT)
-            node = Declaration(self.current_token.value, VariableTypes.INTEGER)
+            if self.current_token.token_type == TokenType.LSQB:
+                self.eat(TokenType.LSQB)
+                size = self.expr()
+                self.eat(TokenType.RSQB)
+                node = ArrayDeclaration(self.current_token.value,
+                                        VariableTypes.INTEGER_ARRAY, size)
+            else:
+                node = Declaration(self.current_token.value,
+                                   VariableTypes.INTEGER)
         elif self.current_token.token_type == TokenType.FLOAT:
             self.eat(TokenType.FLOAT)
-            node = Declaration(self.current_token.value, VariableTypes.FLOAT)
+            if self.current_token.token_type == TokenType.LSQB:
+                self.eat(TokenType.LSQB)
+                size = self.expr()
+                self.eat(TokenType.RSQB)
+                node = ArrayDeclaration(self.current_token.value,
+                                        VariableTypes.FLOAT_ARRAY, size)
+            else:
+                node = Declaration(self.current_token.value,
+                                   VariableTypes.FLOAT)
         else:
             self.error(error_code=ErrorCode.UNEXPECTED_TOKEN,
                        token=self.current_token)
         self.eat(TokenType.ID)
+        if self.intern_tables is not None:
+            # Later reads of the name are of the new variable.
+            self.intern_tables[-1].evict(node.id)
         print("END declaration_statement")
         return node
 
     def variable(self):
-        """variable: ID"""
+        """variable: ID (LSQB expr RSQB)?"""
         print("BEGIN variable")
-        node = ast.Name(self.current_token.value)
+        node = self.intern(ast.Name(self.current_token.value))
         self.eat(TokenType.ID)
+        if self.current_token.token_type == TokenType.LSQB:
+            self.eat(TokenType.LSQB)
+            node = self.intern(ast.Subscript(node, self.expr()))
+            self.eat(TokenType.RSQB)
         print("END variable")
         return node
 
-    def expr(self):
-        """expr: term ((PLUS | MINUS) term)*"""
+    def expr(self, min_binding_power: int = 0):
+        """expr: factor (binary_operator factor)*"""
         print("BEGIN expr")
-        node = self.term()
-
-        while self.current_token.token_type in (
-                TokenType.PLUS, TokenType.MINUS):
-            token = self.current_token
-            op = None
-            if token.token_type == TokenType.PLUS:
-                op = ast.Add()
-                self.eat(TokenType.PLUS)
-            elif token.token_type == TokenType.MINUS:
-                op = ast.Sub()
-                self.eat(TokenType.MINUS)
-
-            node = ast.BinOp(node, op, self.term())
-        print("END expr")
-        return node
-
-    def term(self):
-        """term: factor ((MUL | DIV) factor)*"""
-        print("BEGIN term")
         node = self.factor()
-        while self.current_token.token_type in (TokenType.MUL, TokenType.DIV):
-            token = self.current_token
-            op = None
-            if token.token_type == TokenType.MUL:
-                op = ast.Mult()
-                self.eat(TokenType.MUL)
-            elif token.token_type == TokenType.DIV:
-                op = ast.Div()
-                self.eat(TokenType.DIV)
-
-            node = ast.BinOp(node, op, self.factor())
-        print("END term")
+        while True:
+            token_type = self.current_token.token_type
+            operator = BINARY_OPERATORS.get(token_type)
+            if operator is None or operator[0] <= min_binding_power:
+                break
+            binding_power, op_type = operator
+            self.eat(token_type)
+            node = self.intern(ast.BinOp(node, op_type(),
+                                         self.expr(binding_power)))
+        print("END expr")
         return node
 
     def factor(self):
-        """factor: (PLUS | MINUS) factor
+        """factor: prefix_operator factor
                  | INTEGER
                  | LPAREN expr RPAREN
+                 | LEN LPAREN expr RPAREN
                  | proccall_statement
                  | variable"""
         print("BEGIN factor")
         token = self.current_token
         node = None
-        if token.token_type == TokenType.PLUS:
-            self.eat(TokenType.PLUS)
-            node = ast.UnaryOp(ast.UAdd(), self.factor())
-        elif token.token_type == TokenType.MINUS:
-            self.eat(TokenType.MINUS)
-            node = ast.UnaryOp(ast.USub(), self.factor())
+        if token.token_type in PREFIX_OPERATORS:
+            self.eat(token.token_type)
+            node = self.intern(ast.UnaryOp(
+                PREFIX_OPERATORS[token.token_type](), self.factor()))
         elif token.token_type == TokenType.INTEGER:
             self.eat(TokenType.INTEGER)
-            node = ast.Num(token.value)
+            node = self.intern(ast.Num(token.value))
         elif token.token_type == TokenType.LPAR:
             self.eat(TokenType.LPAR)
             node = self.expr()
             self.eat(TokenType.RPAR)
-        elif token.token_type == TokenType.ID and self.lexer.current_char == "(":
+        elif token.token_type == TokenType.LEN:
+            self.eat(TokenType.LEN)
+            self.eat(TokenType.LPAR)
+            node = self.intern(ArrayLength(self.expr()))
+            self.eat(TokenType.RPAR)
+        elif token.token_type == TokenType.ID and \
+                self.peek().token_type == TokenType.LPAR:
             node = self.proccall_statement()
         else:
             node = self.variable()
@@ -315,7 +520,7 @@ class Parser(object):
         return ast.Return(value=self.expr())
 
     def conditional_statement(self):
-        """conditional_statement: if LPAR expr RPAR (statement SEMI | compound_statement) (else (statement SEMI | compund_statement))?"""
+        """conditional_statement: if LPAR expr RPAR (statement | compound_statement) (else (statement | compound_statement))?"""
         print("BEGIN conditional_statement")
         self.eat(TokenType.IF)
         self.eat(TokenType.LPAR)
@@ -325,7 +530,6 @@ class Parser(object):
             body = self.compound_statement()
         else:
             body = self.statement()
-            self.eat(TokenType.SEMI)
         else_body = None
         if self.current_token.token_type == TokenType.ELSE:
             self.eat(TokenType.ELSE)
@@ -333,12 +537,12 @@ class Parser(object):
                 else_body = self.compound_statement()
             else:
                 else_body = self.statement()
-                self.eat(TokenType.SEMI)
         print("END conditional_statement")
         return ast.If(test=expr, body=body, orelse=else_body)
 
     def loop_statement(self):
-        """loop_statement: for_statement | while_statement | do_while_statement"""
+        """loop_statement: for_statement | while_statement | do_while_statement
+                         | parfor_statement"""
         print("BEGIN loop_statement")
         node = None
         if self.current_token.token_type == TokenType.FOR:
@@ -347,30 +551,54 @@ class Parser(object):
             node = self.while_statement()
         elif self.current_token.token_type == TokenType.DO:
             node = self.do_while_statement()
+        elif self.current_token.token_type == TokenType.PARFOR:
+            node = self.parfor_statement()
         print("END loop_statement")
         return node
 
     def for_statement(self):
-        """for_statement: FOR LPAR statement SEMI EXPR SEMI statement RPAR (statement SEMI | compound_statement)"""
+        """for_statement: FOR LPAR simple_statement SEMI expr SEMI simple_statement RPAR (statement | compound_statement)"""
         print("BEGIN for_statement")
         self.eat(TokenType.FOR)
         self.eat(TokenType.LPAR)
-        expr1 = self.statement()
+        expr1 = self.simple_statement()
         self.eat(TokenType.SEMI)
         expr2 = self.expr()
         self.eat(TokenType.SEMI)
-        expr3 = self.statement()
+        expr3 = self.simple_statement()
         self.eat(TokenType.RPAR)
         if self.current_token.token_type == TokenType.LBR:
             body = self.compound_statement()
         else:
             body = self.statement()
-            self.eat(TokenType.SEMI)
         print("END for_statement")
         return IterFor(expr1, expr2, expr3, body)
 
+    def parfor_statement(self):
+        """parfor_statement: PARFOR LPAR ID ASSIGN expr COMMA expr RPAR (statement | compound_statement)"""
+        print("BEGIN parfor_statement")
+        self.eat(TokenType.PARFOR)
+        self.eat(TokenType.LPAR)
+        target = self.current_token.value
+        self.eat(TokenType.ID)
+        self.eat(TokenType.ASSIGN)
+        start = self.expr()
+        self.eat(TokenType.COMMA)
+        stop = self.expr()
+        self.eat(TokenType.RPAR)
+        self.interning_paused += 1
+        try:
+            if self.current_token.token_type == TokenType.LBR:
+                body = self.compound_statement()
+            else:
+                body = self.statement()
+        finally:
+            self.interning_paused -= 1
+        print("END parfor_statement")
+        return ParFor(target, start, stop, body)
+
     def while_statement(self):
-        """while_statement: WHILE LPAR EXPR RPAR (statement SEMI | compound_statement)"""
+        """while_statement: WHILE LPAR EXPR RPAR (statement | compound_statement)"""
         print("BEGIN while_statement")
         self.eat(TokenType.WHILE)
         self.eat(TokenType.LPAR)
@@ -380,19 +608,17 @@ class Parser(object):
             body = self.compound_statement()
         else:
             body = self.statement()
-            self.eat(TokenType.SEMI)
         print("END while_statement")
         return ast.While(test=expr, body=body)
 
     def do_while_statement(self):
-        """DO (statement SEMI | compound_statement) WHILE LPAR expr RPAR SEMI"""
+        """DO (statement | compound_statement) WHILE LPAR expr RPAR SEMI"""
         print("BEGIN do_while_statement")
         self.eat(TokenType.DO)
         if self.current_token.token_type == TokenType.LBR:
             body = self.compound_statement()
         else:
             body = self.statement()
-            self.eat(TokenType.SEMI)
         self.eat(TokenType.WHILE)
         self.eat(TokenType.LPAR)
         expr = self.expr()
@@ -421,11 +647,13 @@ class Parser(object):
             print(self.current_token.value)
             self.error(error_code=ErrorCode.UNEXPECTED_TOKEN,
                        token=self.current_token)
+        if self.metrics is not None:
+            self.metrics.inc('nodes_parsed', sum(1 for _ in ast.walk(node)))
         return node
 
     def get_grammar(self):
         object_methods = [method_name for method_name in dir(self)
-                          if callable(getattr(self, method_name)) and method_name not in ("parse", "eat", "error", "get_grammar") and not method_name.startswith("__")]
+                          if callable(getattr(self, method_name)) and method_name not in ("parse", "iter_program", "eat", "peek", "intern", "error", "synchronize", "get_grammar") and not method_name.startswith("__")]
         doc_strings = []
         for object_method in map(lambda x: getattr(self, x), object_methods):
             if not inspect.isbuiltin(object_method):
@@ -19,6 +19,8 @@ class TokenType(Enum):
     LBR = '{'
     RBR = '}'
     COMMA = ','
+    LSQB = '['
+    RSQB = ']'
     # RESERVED TOKENS
     VAR = 'var'
     INT = 'int'
@@ -31,6 +33,9 @@ class TokenType(Enum):
     DO = 'do'
     BREAK = 'break'
     CONTINUE = 'continue'
+    LEN = 'len'
+    PARFOR = 'parfor'
+    IMPORT = 'import'
     DEF = 'def'
     # OTHER
     INTEGER = 'INTEGER'
@@ -43,14 +48,22 @@ class ErrorCode(Enum):
     IDENTIFIER_NOT_FOUND = 'Identifier not found'
     DUPLICATE_ID = 'Duplicate identifier found'
     WRONG_PARAM_NUM = 'Wrong number of parameters'
+    NOT_AN_ARRAY = 'Identifier is not an array'
+    LOOP_DEPENDENCY = 'Cross-iteration dependency in parfor'
+    MODULE_NOT_FOUND = 'Module not found'
+    IMPORT_CYCLE = 'Circular import'
+    MODULE_STATEMENT = 'Only functions and imports are allowed in a module'
 
 
 class VariableTypes(Enum):
     UNIVERSAL = 'UNIVERSAL'
     INTEGER = 'INTEGER'
     FLOAT = 'FLOAT'
+    INTEGER_ARRAY = 'INTEGER_ARRAY'
+    FLOAT_ARRAY = 'FLOAT_ARRAY'
 
 
 class ARType(Enum):
     PROGRAM = 'PROGRAM'
-    PROCEDURE = 'PROCEDURE'
\ No newline at end of file
+    PROCEDURE = 'PROCEDURE'
+    PARFOR_CHUNK = 'PARFOR_CHUNK'
\ No newline at end of file
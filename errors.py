@@ -10,13 +10,24 @@ class ContinueIteration(Exception):
     pass
 
 
+class BreakIteration(Exception):
+    pass
+
+
 class PreInterpretError(Exception):
     def __init__(self, error_code: ErrorCode = None, token: Token = None,
-                 message=None):
+                 message=None, lineno: int = None, column: int = None):
         self.error_code = error_code
         self.token = token
+        # Position of errors without a token, like those of the lexer.
+        self.lineno = lineno
+        self.column = column
         super(PreInterpretError, self).__init__(message)
 
+    def __reduce__(self):
+        return self.__class__, (self.error_code, self.token, str(self),
+                                self.lineno, self.column)
+
 
 class LexerError(PreInterpretError):
     pass
@@ -28,3 +39,15 @@ class ParserError(PreInterpretError):
 
 class SemanticError(PreInterpretError):
     pass
+
+
+class ModuleError(PreInterpretError):
+    pass
+
+
+class Deoptimization(Exception):
+    pass
+
+
+class NotCompilable(Exception):
+    pass
@@ -0,0 +1,500 @@
+import ast
+from typing import Union
+
+from enums import ErrorCode, TokenType, VariableTypes
+from errors import ParserError
+from nodes import Compound, Declaration, Param, DupaCall, IterFor, DoWhile, \
+    ArrayDeclaration, ArrayLength, ParFor
+from tokens import Token
+
+# Nonterminals are lower case, terminals are TokenType names, @name is an
+# action run on the value stack once everything before it was parsed and
+# ``empty`` is the empty alternative. ID and INTEGER push their values.
+GRAMMAR = """
+program: @mark statement_list EOF @module
+statement_list: item statement_list | empty
+item: compound_statement | function_definition | import_statement | statement
+import_statement: IMPORT ID @import SEMI
+compound_statement: LBR @mark statement_list RBR @compound
+statement: simple_statement SEMI | conditional_statement | loop_statement
+simple_statement: ID @name id_statement
+                | declaration_statement
+                | RETURN expr @return
+                | BREAK @break
+                | CONTINUE @continue
+                | @pass
+id_statement: LPAR @mark call_args RPAR @call
+            | LSQB expr RSQB @subscript ASSIGN expr @assign
+            | ASSIGN expr @assign
+declaration_statement: VAR ID @declare_var
+                     | INT @int_types declaration
+                     | FLOAT @float_types declaration
+declaration: ID @declare | LSQB expr RSQB ID @declare_array
+function_definition: DEF return_type ID LPAR @mark arguments RPAR compound_statement @function
+return_type: INT @int_type | FLOAT @float_type | VAR @var_type | @no_type
+arguments: argument arguments_rest | empty
+arguments_rest: COMMA argument arguments_rest | empty
+argument: VAR ID @param_var | INT @int_types param | FLOAT @float_types param
+param: ID @param | LSQB RSQB ID @param_array
+body: compound_statement | statement
+conditional_statement: IF LPAR expr RPAR body else_part @if
+else_part: ELSE body | @no_else
+loop_statement: FOR LPAR simple_statement SEMI expr SEMI simple_statement RPAR body @for
+              | WHILE LPAR expr RPAR body @while
+              | DO body WHILE LPAR expr RPAR SEMI @do_while
+              | PARFOR LPAR ID ASSIGN expr COMMA expr RPAR body @parfor
+expr: term expr_rest
+expr_rest: PLUS term @add expr_rest | MINUS term @sub expr_rest | empty
+term: factor term_rest
+term_rest: MUL factor @mul term_rest | DIV factor @div term_rest | empty
+factor: PLUS factor @uadd
+      | MINUS factor @usub
+      | INTEGER @num
+      | LPAR expr RPAR
+      | LEN LPAR expr RPAR @len
+      | ID @name id_tail
+id_tail: LPAR @mark call_args RPAR @call | LSQB expr RSQB @subscript | empty
+call_args: expr call_args_rest | empty
+call_args_rest: COMMA expr call_args_rest | empty
+"""
+
+VALUE_TERMINALS = (TokenType.ID, TokenType.INTEGER)
+
+ACTIONS = {}
+
+MARK = object()
+
+
+def action(name: str):
+    def decorator(function):
+        ACTIONS[name] = function
+        return function
+    return decorator
+
+
+class Grammar(object):
+    """LL(1) grammar with its FIRST and FOLLOW sets and parse table.
+
+    Productions map a nonterminal to its alternatives, lists of nonterminal
+    names, TokenType members and action functions. The only conflict allowed
+    is an empty alternative against a token which can also start another
+    one, like ``else`` in nested conditionals, it goes to the non-empty
+    alternative and is recorded in ``resolved_conflicts``.
+    """
+
+    def __init__(self, text: str, actions: dict, start: str = 'program'):
+        self.start = start
+        self.productions = {}
+        self._read(text, actions)
+        self.first = {}
+        self.follow = {}
+        self.table = {}
+        self.resolved_conflicts = []
+        self._compute_first()
+        self._compute_follow()
+        self._build_table()
+
+    def _read(self, text: str, actions: dict):
+        rules = []
+        for line in text.strip().splitlines():
+            if line.startswith((' ', '\t')):
+                rules[-1] += ' ' + line.strip()
+            else:
+                rules.append(line)
+        self.action_names = {function: name
+                             for name, function in actions.items()}
+        for rule in rules:
+            name, alternatives = rule.split(':', 1)
+            self.productions[name.strip()] = [
+                [self._symbol(word, actions) for word in alternative.split()
+                 if word != 'empty']
+                for alternative in alternatives.split('|')
+            ]
+        for alternatives in self.productions.values():
+            for alternative in alternatives:
+                for symbol in alternative:
+                    if isinstance(symbol, str) and \
+                            symbol not in self.productions:
+                        raise ValueError(f'Undefined nonterminal {symbol!r}')
+
+    @staticmethod
+    def _symbol(word: str, actions: dict):
+        if word.startswith('@'):
+            return actions[word[1:]]
+        if word.isupper():
+            return TokenType[word]
+        return word
+
+    def first_of(self, symbols) -> (set, bool):
+        """FIRST set of a symbol sequence and whether it derives empty."""
+        result = set()
+        for symbol in symbols:
+            if isinstance(symbol, TokenType):
+                result.add(symbol)
+                return result, False
+            if isinstance(symbol, str):
+                first, nullable = self.first[symbol]
+                result |= first
+                if not nullable:
+                    return result, False
+        return result, True
+
+    def _compute_first(self):
+        self.first = {name: (set(), False) for name in self.productions}
+        changed = True
+        while changed:
+            changed = False
+            for name, alternatives in self.productions.items():
+                first, nullable = self.first[name]
+                size = len(first)
+                for alternative in alternatives:
+                    alternative_first, alternative_nullable = \
+                        self.first_of(alternative)
+                    first |= alternative_first
+                    if alternative_nullable and not nullable:
+                        nullable = True
+                        self.first[name] = (first, True)
+                        changed = True
+                if len(first) != size:
+                    changed = True
+
+    def _compute_follow(self):
+        self.follow = {name: set() for name in self.productions}
+        self.follow[self.start].add(TokenType.EOF)
+        changed = True
+        while changed:
+            changed = False
+            for name, alternatives in self.productions.items():
+                for alternative in alternatives:
+                    for index, symbol in enumerate(alternative):
+                        if not isinstance(symbol, str):
+                            continue
+                        first, nullable = self.first_of(
+                            alternative[index + 1:])
+                        follow = self.follow[symbol]
+                        size = len(follow)
+                        follow |= first
+                        if nullable:
+                            follow |= self.follow[name]
+                        if len(follow) != size:
+                            changed = True
+
+    def _build_table(self):
+        for name, alternatives in self.productions.items():
+            row = self.table[name] = {}
+            for alternative in alternatives:
+                first, nullable = self.first_of(alternative)
+                lookaheads = first | (self.follow[name] if nullable else set())
+                # Stored reversed, ready to be pushed on the parse stack.
+                entry = alternative[::-1]
+                for token_type in lookaheads:
+                    existing = row.get(token_type)
+                    if existing is None:
+                        row[token_type] = entry
+                    elif self._from_follow(existing, token_type) \
+                            and token_type in first:
+                        self.resolved_conflicts.append((name, token_type))
+                        row[token_type] = entry
+                    elif nullable and token_type not in first:
+                        self.resolved_conflicts.append((name, token_type))
+                    else:
+                        raise ValueError(f'Grammar is not LL(1): {name} on '
+                                         f'{token_type}')
+
+    def _from_follow(self, entry, token_type) -> bool:
+        first, nullable = self.first_of(entry[::-1])
+        return nullable and token_type not in first
+
+    def __str__(self):
+        lines = []
+        for name, alternatives in self.productions.items():
+            text = ' | '.join(
+                ' '.join(self._word(symbol) for symbol in alternative)
+                or 'empty'
+                for alternative in alternatives
+            )
+            lines.append(f'{name}: {text}')
+        return '\n'.join(lines)
+
+    def _word(self, symbol) -> str:
+        if isinstance(symbol, TokenType):
+            return symbol.name
+        if isinstance(symbol, str):
+            return symbol
+        return '@' + self.action_names[symbol]
+
+
+def _pop_marked(values: list) -> list:
+    index = len(values) - 1
+    while values[index] is not MARK:
+        index -= 1
+    items = values[index + 1:]
+    del values[index:]
+    return items
+
+
+@action('mark')
+def _mark(values):
+    values.append(MARK)
+
+
+@action('module')
+def _module(values):
+    values.append(ast.Module(body=_pop_marked(values)))
+
+
+@action('compound')
+def _compound(values):
+    values.append(Compound(_pop_marked(values)))
+
+
+@action('import')
+def _import(values):
+    values.append(ast.Import(names=[ast.alias(name=values.pop())]))
+
+
+@action('name')
+def _name(values):
+    values.append(ast.Name(values.pop()))
+
+
+@action('call')
+def _call(values):
+    args = _pop_marked(values)
+    values.append(DupaCall(func=values.pop(), args=args))
+
+
+@action('subscript')
+def _subscript(values):
+    index = values.pop()
+    values.append(ast.Subscript(values.pop(), index))
+
+
+@action('assign')
+def _assign(values):
+    value = values.pop()
+    values.append(ast.Assign([values.pop()], value))
+
+
+@action('return')
+def _return(values):
+    values.append(ast.Return(value=values.pop()))
+
+
+@action('break')
+def _break(values):
+    values.append(ast.Break())
+
+
+@action('continue')
+def _continue(values):
+    values.append(ast.Continue())
+
+
+@action('pass')
+def _pass(values):
+    values.append(ast.Pass())
+
+
+@action('int_types')
+def _int_types(values):
+    values.append((VariableTypes.INTEGER, VariableTypes.INTEGER_ARRAY))
+
+
+@action('float_types')
+def _float_types(values):
+    values.append((VariableTypes.FLOAT, VariableTypes.FLOAT_ARRAY))
+
+
+@action('declare_var')
+def _declare_var(values):
+    values.append(Declaration(values.pop(), VariableTypes.UNIVERSAL))
+
+
+@action('declare')
+def _declare(values):
+    name = values.pop()
+    values.append(Declaration(name, values.pop()[0]))
+
+
+@action('declare_array')
+def _declare_array(values):
+    name = values.pop()
+    size = values.pop()
+    values.append(ArrayDeclaration(name, values.pop()[1], size))
+
+
+@action('int_type')
+def _int_type(values):
+    values.append(VariableTypes.INTEGER)
+
+
+@action('float_type')
+def _float_type(values):
+    values.append(VariableTypes.FLOAT)
+
+
+@action('var_type')
+def _var_type(values):
+    values.append(VariableTypes.UNIVERSAL)
+
+
+@action('no_type')
+def _no_type(values):
+    values.append(None)
+
+
+@action('function')
+def _function(values):
+    body = values.pop()
+    arguments = _pop_marked(values)
+    name = values.pop()
+    values.append(ast.FunctionDef(name=name, args=arguments, body=body,
+                                  returns=values.pop()))
+
+
+@action('param_var')
+def _param_var(values):
+    values.append(Param(values.pop(), VariableTypes.UNIVERSAL))
+
+
+@action('param')
+def _param(values):
+    name = values.pop()
+    values.append(Param(name, values.pop()[0]))
+
+
+@action('param_array')
+def _param_array(values):
+    name = values.pop()
+    values.append(Param(name, values.pop()[1]))
+
+
+@action('if')
+def _if(values):
+    else_body = values.pop()
+    body = values.pop()
+    values.append(ast.If(test=values.pop(), body=body, orelse=else_body))
+
+
+@action('no_else')
+def _no_else(values):
+    values.append(None)
+
+
+@action('for')
+def _for(values):
+    body = values.pop()
+    expr3 = values.pop()
+    expr2 = values.pop()
+    values.append(IterFor(values.pop(), expr2, expr3, body))
+
+
+@action('while')
+def _while(values):
+    body = values.pop()
+    values.append(ast.While(test=values.pop(), body=body))
+
+
+@action('do_while')
+def _do_while(values):
+    expr = values.pop()
+    values.append(DoWhile(expr, values.pop()))
+
+
+@action('parfor')
+def _parfor(values):
+    body = values.pop()
+    stop = values.pop()
+    start = values.pop()
+    values.append(ParFor(values.pop(), start, stop, body))
+
+
+def _binary(op_type):
+    def build(values):
+        right = values.pop()
+        values.append(ast.BinOp(values.pop(), op_type(), right))
+    return build
+
+
+def _unary(op_type):
+    def build(values):
+        values.append(ast.UnaryOp(op_type(), values.pop()))
+    return build
+
+
+ACTIONS.update(add=_binary(ast.Add), sub=_binary(ast.Sub),
+               mul=_binary(ast.Mult), div=_binary(ast.Div),
+               uadd=_unary(ast.UAdd), usub=_unary(ast.USub))
+
+
+@action('num')
+def _num(values):
+    values.append(ast.Num(values.pop()))
+
+
+@action('len')
+def _len(values):
+    values.append(ArrayLength(values.pop()))
+
+
+DUPA_GRAMMAR = Grammar(GRAMMAR, ACTIONS)
+
+
+class TableParser(object):
+    """LL(1) parser driven by the table of ``DUPA_GRAMMAR``.
+
+    Builds the same trees as ``Parser`` with an explicit parse stack and a
+    value stack instead of Python recursion, so nesting depth is only
+    limited by memory.
+    """
+
+    def __init__(self, lexer, metrics=None, grammar: Grammar = DUPA_GRAMMAR):
+        self.lexer = lexer
+        self.metrics = metrics
+        self.grammar = grammar
+        self.current_token: Union[Token, None] = self.lexer.get_next_token()
+
+    def error(self, error_code: ErrorCode, token: Token):
+        print(str(error_code))
+        raise ParserError(
+            error_code=error_code,
+            token=token,
+            message=f'{str(error_code.value)} -> {str(token)}',
+        )
+
+    def parse(self):
+        table = self.grammar.table
+        get_next_token = self.lexer.get_next_token
+        token = self.current_token
+        stack = [self.grammar.start]
+        values = []
+        while stack:
+            symbol = stack.pop()
+            symbol_class = symbol.__class__
+            if symbol_class is str:
+                entry = table[symbol].get(token.token_type)
+                if entry is None:
+                    self.current_token = token
+                    self.error(error_code=ErrorCode.UNEXPECTED_TOKEN,
+                               token=token)
+                stack.extend(entry)
+            elif symbol_class is TokenType:
+                if token.token_type is not symbol:
+                    self.current_token = token
+                    self.error(error_code=ErrorCode.UNEXPECTED_TOKEN,
+                               token=token)
+                if symbol in VALUE_TERMINALS:
+                    values.append(token.value)
+                if symbol is not TokenType.EOF:
+                    token = get_next_token()
+            else:
+                symbol(values)
+        self.current_token = token
+        node = values.pop()
+        if self.metrics is not None:
+            self.metrics.inc('nodes_parsed', sum(1 for _ in ast.walk(node)))
+        return node
+
+    def get_grammar(self):
+        return str(self.grammar)
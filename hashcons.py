@@ -0,0 +1,84 @@
+import ast
+import sys
+
+# Operators and contexts are compared by class, the parser creates a new
+# instance for every occurrence.
+SINGLETON_NODES = (ast.operator, ast.unaryop, ast.boolop, ast.cmpop,
+                   ast.expr_context)
+
+
+class InternTable(object):
+    """Hash-consing table of the expressions of one scope.
+
+    A node is keyed by its class, its scalar fields and the identity of its
+    children, which are interned first, so structurally equal expressions
+    are found in O(1) and end up as one shared node. Nodes with a child
+    that was not interned, like a call, are never shared. Every variable
+    maps to the keys of the nodes reading it, a declaration shadowing the
+    variable evicts them.
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        # id(node) -> names of the variables read by an interned node.
+        self.variables = {}
+        self.readers = {}
+        self.interned = 0
+        self.shared = 0
+
+    def intern(self, node: ast.expr) -> ast.expr:
+        key = [node.__class__]
+        names = set()
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if isinstance(value, SINGLETON_NODES):
+                key.append(value.__class__)
+            elif isinstance(value, ast.AST):
+                child_names = self.variables.get(id(value))
+                if child_names is None:
+                    return node
+                key.append(id(value))
+                names |= child_names
+            elif isinstance(value, list):
+                return node
+            else:
+                key.append((value.__class__, value))
+        if isinstance(node, ast.Name):
+            names.add(node.id)
+        key = tuple(key)
+        shared = self.nodes.get(key)
+        if shared is not None:
+            self.shared += 1
+            return shared
+        self.nodes[key] = node
+        self.variables[id(node)] = frozenset(names)
+        for name in names:
+            self.readers.setdefault(name, []).append(key)
+        self.interned += 1
+        return node
+
+    def evict(self, name: str):
+        for key in self.readers.pop(name, ()):
+            node = self.nodes.pop(key, None)
+            if node is not None:
+                del self.variables[id(node)]
+
+
+def tree_footprint(tree: ast.AST) -> dict:
+    """Size of a tree counting shared nodes once and once per occurrence."""
+    occurrences = 0
+    unshared_bytes = 0
+    distinct = {}
+    for node in ast.walk(tree):
+        size = sys.getsizeof(node) + sys.getsizeof(node.__dict__)
+        occurrences += 1
+        unshared_bytes += size
+        distinct[id(node)] = size
+    nodes_bytes = sum(distinct.values())
+    return {
+        'nodes': occurrences,
+        'distinct_nodes': len(distinct),
+        'bytes': nodes_bytes,
+        'unshared_bytes': unshared_bytes,
+        'saved': 1 - nodes_bytes / unshared_bytes if unshared_bytes else 0.0,
+    }
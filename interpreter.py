@@ -1,18 +1,43 @@
 import ast
 from typing import Any
 
-from dupa_collections import CallStack
+from dupa_collections import CallStack, FramePool
 from enums import VariableTypes, ARType
-from errors import ReturnedValue, ContinueIteration
-from nodes import Compound, Declaration, DupaCall, IterFor, DoWhile
+from errors import ReturnedValue, ContinueIteration, BreakIteration, \
+    Deoptimization
+from arrays import new_array, store_element
+from nodes import Compound, Declaration, DupaCall, IterFor, DoWhile, \
+    ArrayDeclaration, ArrayLength, ParFor, LazyBody
 from dupa_parser import Parser
 from containers import ActivationRecord
+from lazy import materialize
+from parallel import default_loops
+from passes import TEMPORARY_PREFIX
+from symbols import NativeProcedureSymbol
+from visitors import DispatchVisitor
 
 
-class Interpreter(ast.NodeVisitor):
-    def __init__(self, parser: Parser):
+class Interpreter(DispatchVisitor):
+    def __init__(self, parser: Parser, tiering=None, metrics=None,
+                 parallel=None):
         self.parser = parser
         self.call_stack = CallStack()
+        # Innermost activation record of every nesting level in scope,
+        # indexed by the level. Variables are found in it in O(1) through
+        # the scope level the analyzer stores in Name nodes.
+        self.display = []
+        self.frame_pool = FramePool()
+        self.tiering = tiering
+        self.current_proc = None
+        self.metrics = metrics
+        self.parallel = parallel
+        if metrics is not None:
+            self.visit = self._counting_visit
+
+    def _counting_visit(self, node):
+        if isinstance(node, ast.stmt) and not isinstance(node, Compound):
+            self.metrics.inc('statements_executed')
+        return DispatchVisitor.visit(self, node)
 
     def visit_BinOp(self, node: ast.BinOp) -> Any:
         if isinstance(node.op, ast.Add):
@@ -38,26 +63,80 @@ class Interpreter(ast.NodeVisitor):
             self.visit(child)
 
     def visit_Module(self, node: ast.Module) -> Any:
+        ar = self.enter_program()
+        for child in node.body:
+            self.visit(child)
+        self.leave_program()
+        return ar
+
+    def enter_program(self) -> ActivationRecord:
+        """Push the record of the globals, top-level statements run in it."""
         ar = ActivationRecord(
             name="program",
             type_of=ARType.PROGRAM,
             nesting_level=1
         )
 
-        self.call_stack.push(ar)
+        self.enter_frame(ar)
+        if self.metrics is not None:
+            self.metrics.set_max('call_stack_peak_depth', 1)
+        return ar
 
-        for child in node.body:
-            self.visit(child)
+    def leave_program(self) -> ActivationRecord:
         print(self.call_stack)
+        ar = self.call_stack.peek()
+        self.leave_frame(ar, None)
+        self.drop_temporaries(ar)
+        return ar
+
+    @staticmethod
+    def drop_temporaries(ar: ActivationRecord):
+        """Remove the temporaries of the optimizer from the globals, they
+        are dead once the program finished."""
+        for name in [name for name in ar.members
+                     if name.startswith(TEMPORARY_PREFIX)]:
+            del ar.members[name]
+
+    def enter_frame(self, ar: ActivationRecord) -> ActivationRecord:
+        """Push ``ar`` and make it the display entry of its level.
+
+        Returns the entry it replaces, leave_frame puts it back.
+        """
+        self.call_stack.push(ar)
+        display = self.display
+        level = ar.nesting_level
+        if level >= len(display):
+            display.extend([None] * (level + 1 - len(display)))
+        saved = display[level]
+        display[level] = ar
+        return saved
+
+    def leave_frame(self, ar: ActivationRecord, saved: ActivationRecord):
         self.call_stack.pop()
+        self.display[ar.nesting_level] = saved
+
+    def rebuild_display(self):
+        """Point the display at the frames on the call stack.
+
+        Needed after the call stack was replaced or left unwound by an error.
+        """
+        display = self.display = []
+        for ar in self.call_stack.items:
+            level = ar.nesting_level
+            if level >= len(display):
+                display.extend([None] * (level + 1 - len(display)))
+            display[level] = ar
 
     def visit_Pass(self, node: ast.Pass) -> Any:
         pass
 
     def visit_Assign(self, node: ast.Assign) -> Any:
-        var_name = node.targets[0].id
-        ar = self.call_stack.peek()
-        ar[var_name] = self.visit(node.value)
+        target = node.targets[0]
+        if isinstance(target, ast.Subscript):
+            store_element(self.visit(target.value), self.visit(target.slice),
+                          self.visit(node.value))
+            return
+        self.display[target.scope_level][target.id] = self.visit(node.value)
 
     def visit_Declaration(self, node: Declaration) -> Any:
         var_name = node.id
@@ -69,30 +148,60 @@ class Interpreter(ast.NodeVisitor):
         elif node.type == VariableTypes.FLOAT:
             ar[var_name] = 0.0
 
-    def visit_Name(self, node: ast.Name) -> Any:
-        var_name = node.id
+    def visit_ArrayDeclaration(self, node: ArrayDeclaration) -> Any:
         ar = self.call_stack.peek()
-        return ar.get(var_name)
+        ar[node.id] = new_array(node.type, self.visit(node.size))
+
+    def visit_Subscript(self, node: ast.Subscript) -> Any:
+        return self.visit(node.value)[self.visit(node.slice)]
+
+    def visit_ArrayLength(self, node: ArrayLength) -> Any:
+        return len(self.visit(node.value))
+
+    def visit_Name(self, node: ast.Name) -> Any:
+        return self.display[node.scope_level].get(node.id)
 
     def visit_FunctionDef(self, node: ast.FunctionDef) -> Any:
         pass
 
+    def visit_Import(self, node: ast.Import) -> Any:
+        pass
+
+    def make_frame(self, proc_symbol, arguments) -> ActivationRecord:
+        ar = self.frame_pool.acquire(proc_symbol)
+        members = ar.members
+        for param_symbol, argument in zip(proc_symbol.params, arguments):
+            members[param_symbol.name] = argument
+        return ar
+
     def visit_DupaCall(self, node: DupaCall) -> Any:
-        proc_name = node.func.id
-        ar = ActivationRecord(
-            name=proc_name,
-            type_of=ARType.PROCEDURE,
-            nesting_level=node.proc_symbol.scope_level + 1
-        )
-        proc_symbol = node.proc_symbol
-        formal_params = proc_symbol.params
-        actual_params = node.args
+        return self.call(node.proc_symbol,
+                         [self.visit(argument_node)
+                          for argument_node in node.args])
 
-        for param_symbol, argument_node in zip(formal_params, actual_params):
-            ar[param_symbol.name] = self.visit(argument_node)
+    def call(self, proc_symbol, arguments) -> Any:
+        if self.metrics is not None:
+            self.metrics.inc('calls')
+            self.metrics.set_max('call_stack_peak_depth',
+                                 len(self.call_stack.items) + 1)
+        if isinstance(proc_symbol, NativeProcedureSymbol):
+            return proc_symbol.invoke(arguments)
+        if proc_symbol.body.__class__ is LazyBody:
+            materialize(proc_symbol)
+        if self.tiering is not None:
+            compiled = self.tiering.enter(proc_symbol, arguments)
+            if compiled is not None:
+                try:
+                    return compiled(self, *arguments)
+                except Deoptimization:
+                    self.tiering.deoptimize(proc_symbol)
 
-        self.call_stack.push(ar)
+        ar = self.make_frame(proc_symbol, arguments)
+        saved = self.enter_frame(ar)
         print(type(proc_symbol.body))
+        caller_proc = self.current_proc
+        self.current_proc = proc_symbol
+        return_value = None
         try:
             self.visit(proc_symbol.body)
         except ReturnedValue:
@@ -102,9 +211,16 @@ class Interpreter(ast.NodeVisitor):
         else:
             if proc_symbol.returns is not None:
                 raise RuntimeError("Return not found")
-        self.call_stack.pop()
+        finally:
+            self.current_proc = caller_proc
+        self.leave_frame(ar, saved)
+        self.frame_pool.release(proc_symbol, ar)
         return return_value
 
+    def back_edge(self):
+        if self.tiering is not None and self.current_proc is not None:
+            self.tiering.back_edge(self.current_proc)
+
     def visit_Return(self, node: ast.Return) -> Any:
         self.call_stack.peek().return_value = self.visit(node.value)
         raise ReturnedValue()
@@ -118,39 +234,74 @@ class Interpreter(ast.NodeVisitor):
     def visit_IterFor(self, node: IterFor) -> Any:
         self.visit(node.expr1)
         while self.visit(node.expr2):
+            if self.metrics is not None:
+                self.metrics.inc('loop_iterations')
             try:
                 self.visit(node.body)
-            except StopIteration:
+            except BreakIteration:
                 break
             except ContinueIteration:
                 pass
             self.visit(node.expr3)
+            self.back_edge()
 
     def visit_While(self, node: ast.While) -> Any:
         while self.visit(node.test):
+            if self.metrics is not None:
+                self.metrics.inc('loop_iterations')
             try:
                 self.visit(node.body)
-            except StopIteration:
+            except BreakIteration:
                 break
             except ContinueIteration:
-                continue
+                pass
+            self.back_edge()
 
     def visit_DoWhile(self, node: DoWhile) -> Any:
         while True:
+            if self.metrics is not None:
+                self.metrics.inc('loop_iterations')
             try:
                 self.visit(node.body)
-            except StopIteration:
+            except BreakIteration:
                 break
             except ContinueIteration:
                 pass
             if not self.visit(node.test):
                 break
+            self.back_edge()
+
+    def visit_ParFor(self, node: ParFor) -> Any:
+        start = self.visit(node.start)
+        stop = self.visit(node.stop)
+        ar = self.display[node.scope_level]
+        parallel = self.parallel if self.parallel is not None \
+            else default_loops()
+        if parallel.run(node, self.display, start, stop):
+            if self.metrics is not None:
+                self.metrics.inc('loop_iterations', stop - start)
+        else:
+            for index in range(start, stop):
+                if self.metrics is not None:
+                    self.metrics.inc('loop_iterations')
+                ar[node.target] = index
+                self.visit(node.body)
+                self.back_edge()
+            self.drop_private(node)
+        ar[node.target] = max(start, stop)
+
+    def drop_private(self, node: ParFor):
+        """Forget the variables declared in the body of a serially run
+        parfor loop, the records of the workers are not sent back either."""
+        members = self.call_stack.peek().members
+        for name in node.private:
+            members.pop(name, None)
 
     def visit_Continue(self, node: ast.Continue) -> Any:
         raise ContinueIteration()
 
     def visit_Break(self, node: ast.Break) -> Any:
-        raise StopIteration()
+        raise BreakIteration()
 
     def interpret(self, tree=None):
         if tree is None:
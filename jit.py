@@ -0,0 +1,320 @@
+import ast
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+
+from arrays import new_array, store_element
+from enums import VariableTypes
+from errors import Deoptimization, NotCompilable
+from nodes import Compound, Declaration, DupaCall, IterFor, DoWhile, \
+    ArrayDeclaration, ArrayLength
+from symbols import ProcedureSymbol
+from visitors import DispatchVisitor
+
+DEFAULT_THRESHOLD = 1000
+
+BINARY_OPERATORS = {
+    ast.Add: '+',
+    ast.Sub: '-',
+    ast.Mult: '*',
+    ast.Div: '/',
+}
+
+UNARY_OPERATORS = {
+    ast.UAdd: '+',
+    ast.USub: '-',
+}
+
+DECLARATION_VALUES = {
+    VariableTypes.UNIVERSAL: 'None',
+    VariableTypes.INTEGER: '0',
+    VariableTypes.FLOAT: '0.0',
+}
+
+
+class FunctionCompiler(DispatchVisitor):
+    """Translates the body of a DUPA function into Python source.
+
+    DUPA variables of the function become Python locals prefixed with
+    ``v_``, variables of enclosing scopes are accessed through the display
+    of the interpreter ``rt``. Calls go through ``rt.call`` so callees are
+    executed in whatever tier they are in. When ``arg_types`` is given the function is specialized for those
+    argument types and raises ``Deoptimization`` on entry for any others.
+    """
+
+    def __init__(self, proc_symbol: ProcedureSymbol, arg_types=None):
+        self.proc_symbol = proc_symbol
+        self.scope_level = proc_symbol.scope_level + 1
+        self.arg_types = arg_types
+        self.lines = []
+        self.constants = {}
+        self.loops = []
+        self.indent = 1
+
+    def emit(self, line: str):
+        self.lines.append('    ' * self.indent + line)
+
+    def constant(self, value) -> str:
+        name = f'k_{len(self.constants)}'
+        self.constants[name] = value
+        return name
+
+    def block(self, node):
+        self.indent += 1
+        start = len(self.lines)
+        self.visit(node)
+        if len(self.lines) == start:
+            self.emit('pass')
+        self.indent -= 1
+
+    def loop_body(self, node, continue_allowed: bool):
+        self.loops.append(continue_allowed)
+        self.block(node)
+        self.loops.pop()
+
+    def compile(self):
+        proc_symbol = self.proc_symbol
+        params = [f'v_{param.name}' for param in proc_symbol.params]
+        param_names = {param.name for param in proc_symbol.params}
+        # Every other variable of the function's own scope is declared.
+        local_names = sorted({
+            node.id for node in ast.walk(proc_symbol.body)
+            if isinstance(node, Declaration) and node.id not in param_names
+        })
+
+        if self.arg_types is not None:
+            for param, arg_type in zip(params, self.arg_types):
+                self.emit(f'if {param}.__class__ is not '
+                          f'{self.constant(arg_type)}:')
+                self.emit('    raise Deoptimization()')
+        for name in local_names:
+            self.emit(f'v_{name} = None')
+        self.visit(proc_symbol.body)
+        if proc_symbol.returns is not None:
+            self.emit('raise RuntimeError("Return not found")')
+
+        function_name = f'dupa_{proc_symbol.name}'
+        source = '\n'.join(
+            [f'def {function_name}({", ".join(["rt"] + params)}):']
+            + self.lines
+        )
+        namespace = dict(self.constants, Deoptimization=Deoptimization,
+                         new_array=new_array, store_element=store_element)
+        code = compile(source, f'<dupa {proc_symbol.name}>', 'exec')
+        exec(code, namespace)
+        return namespace[function_name], source
+
+    def generic_visit(self, node):
+        raise NotCompilable(node.__class__.__name__)
+
+    def visit_Compound(self, node: Compound):
+        for child in node.body:
+            self.visit(child)
+
+    def visit_Pass(self, node: ast.Pass):
+        pass
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        # Nested functions find the variables of this one in its frame.
+        raise NotCompilable('nested function')
+
+    def visit_Declaration(self, node: Declaration):
+        self.emit(f'v_{node.id} = {DECLARATION_VALUES[node.type]}')
+
+    def visit_ArrayDeclaration(self, node: ArrayDeclaration):
+        self.emit(f'v_{node.id} = new_array({self.constant(node.type)}, '
+                  f'{self.expression(node.size)})')
+
+    def visit_Assign(self, node: ast.Assign):
+        target = node.targets[0]
+        if isinstance(target, ast.Subscript):
+            self.emit(f'store_element({self.variable(target.value)}, '
+                      f'{self.expression(target.slice)}, '
+                      f'{self.expression(node.value)})')
+        elif target.scope_level == self.scope_level:
+            self.emit(f'v_{target.id} = {self.expression(node.value)}')
+        else:
+            self.emit(f'rt.display[{target.scope_level}].members'
+                      f'[{target.id!r}] = {self.expression(node.value)}')
+
+    def visit_Return(self, node: ast.Return):
+        value = self.expression(node.value)
+        if self.proc_symbol.returns is None:
+            self.emit(value)
+            self.emit('raise RuntimeError("Unexpected return")')
+        else:
+            self.emit(f'return {value}')
+
+    def visit_If(self, node: ast.If):
+        self.emit(f'if {self.expression(node.test)}:')
+        self.block(node.body)
+        if node.orelse is not None:
+            self.emit('else:')
+            self.block(node.orelse)
+
+    def visit_While(self, node: ast.While):
+        self.emit(f'while {self.expression(node.test)}:')
+        self.loop_body(node.body, continue_allowed=True)
+
+    def visit_IterFor(self, node: IterFor):
+        # A Python continue would skip expr3 and the condition of do-while
+        # loops, such loops stay interpreted.
+        self.visit(node.expr1)
+        self.emit(f'while {self.expression(node.expr2)}:')
+        self.loops.append(False)
+        self.indent += 1
+        self.visit(node.body)
+        self.visit(node.expr3)
+        self.indent -= 1
+        self.loops.pop()
+
+    def visit_DoWhile(self, node: DoWhile):
+        self.emit('while True:')
+        self.loops.append(False)
+        self.indent += 1
+        self.visit(node.body)
+        self.emit(f'if not {self.expression(node.test)}:')
+        self.emit('    break')
+        self.indent -= 1
+        self.loops.pop()
+
+    def visit_Break(self, node: ast.Break):
+        if not self.loops:
+            raise NotCompilable('break outside of a loop')
+        self.emit('break')
+
+    def visit_Continue(self, node: ast.Continue):
+        if not self.loops or not self.loops[-1]:
+            raise NotCompilable('continue outside of a while loop')
+        self.emit('continue')
+
+    def variable(self, node: ast.Name) -> str:
+        if node.scope_level == self.scope_level:
+            return f'v_{node.id}'
+        return f'rt.display[{node.scope_level}].members.get({node.id!r})'
+
+    def expression(self, node) -> str:
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, int):
+                return repr(node.value)
+            return self.constant(node.value)
+        if isinstance(node, ast.Name):
+            return self.variable(node)
+        if isinstance(node, ast.BinOp):
+            return '({} {} {})'.format(self.expression(node.left),
+                                       BINARY_OPERATORS[node.op.__class__],
+                                       self.expression(node.right))
+        if isinstance(node, ast.UnaryOp):
+            return '({}{})'.format(UNARY_OPERATORS[node.op.__class__],
+                                   self.expression(node.operand))
+        if isinstance(node, ast.Subscript):
+            return '{}[{}]'.format(self.variable(node.value),
+                                   self.expression(node.slice))
+        if isinstance(node, ArrayLength):
+            return f'len({self.expression(node.value)})'
+        if isinstance(node, DupaCall):
+            arguments = ', '.join(self.expression(argument)
+                                  for argument in node.args)
+            return f'rt.call({self.constant(node.proc_symbol)}, [{arguments}])'
+        raise NotCompilable(node.__class__.__name__)
+
+
+class TieredExecution(object):
+    """Call and loop counters per function plus their compiled versions.
+
+    Functions start interpreted. Every call and every loop back-edge counts
+    towards ``threshold``; a function crossing it is compiled, by default on
+    a background thread, specialized for the argument types of the call that
+    made it hot. A call with other argument types deoptimizes the function
+    back to the interpreter; it is recompiled later without specialization.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_THRESHOLD,
+                 background: bool = True):
+        self.threshold = threshold
+        self.background = background
+        self.counters = {}
+        self.compiled = {}
+        self.sources = {}
+        self.deoptimized = set()
+        self.not_compilable = {}
+        self.stats = {'compiled': 0, 'deoptimizations': 0,
+                      'compiled_calls': 0, 'interpreted_calls': 0}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor: Union[ThreadPoolExecutor, None] = None
+
+    def enter(self, proc_symbol: ProcedureSymbol, arguments):
+        """Compiled version of ``proc_symbol`` or None to interpret it."""
+        compiled = self.compiled.get(proc_symbol)
+        if compiled is not None:
+            with self._lock:
+                self.stats['compiled_calls'] += 1
+            return compiled
+        with self._lock:
+            self.stats['interpreted_calls'] += 1
+        self.count(proc_symbol, arguments)
+        return None
+
+    def back_edge(self, proc_symbol: ProcedureSymbol):
+        if proc_symbol not in self.compiled:
+            self.count(proc_symbol)
+
+    def count(self, proc_symbol: ProcedureSymbol, arguments=None):
+        # Contexts on other threads count the same functions.
+        with self._lock:
+            counter = self.counters.get(proc_symbol, 0) + 1
+            self.counters[proc_symbol] = counter
+        if counter >= self.threshold and arguments is not None:
+            self.promote(proc_symbol, arguments)
+
+    def promote(self, proc_symbol: ProcedureSymbol, arguments):
+        with self._lock:
+            if (proc_symbol in self._pending
+                    or proc_symbol in self.compiled
+                    or proc_symbol in self.not_compilable):
+                return
+            self._pending.add(proc_symbol)
+        if proc_symbol in self.deoptimized:
+            arg_types = None
+        else:
+            arg_types = tuple(argument.__class__ for argument in arguments)
+        if self.background:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix='dupa-jit')
+            self._executor.submit(self._compile, proc_symbol, arg_types)
+        else:
+            self._compile(proc_symbol, arg_types)
+
+    def _compile(self, proc_symbol: ProcedureSymbol, arg_types):
+        try:
+            function, source = FunctionCompiler(proc_symbol,
+                                                arg_types).compile()
+        except NotCompilable as e:
+            self.not_compilable[proc_symbol] = str(e)
+        else:
+            self.sources[proc_symbol] = source
+            self.compiled[proc_symbol] = function
+            with self._lock:
+                self.stats['compiled'] += 1
+        finally:
+            with self._lock:
+                self._pending.discard(proc_symbol)
+
+    def deoptimize(self, proc_symbol: ProcedureSymbol):
+        self.compiled.pop(proc_symbol, None)
+        with self._lock:
+            self.deoptimized.add(proc_symbol)
+            self.counters[proc_symbol] = 0
+            self.stats['deoptimizations'] += 1
+
+    def wait(self):
+        """Block until every queued compilation has finished."""
+        if self._executor is not None:
+            self._executor.submit(lambda: None).result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,31 @@
+import threading
+
+from analyzer import SemanticAnalyzer
+from dupa_parser import Parser
+from lexer import Lexer
+from nodes import Compound, LazyBody
+from symbols import ProcedureSymbol
+
+_lock = threading.Lock()
+
+
+def materialize(proc_symbol: ProcedureSymbol) -> Compound:
+    """Parse and analyze a lazily parsed function body, once.
+
+    Called on the first call of the function. Threads calling it at the
+    same time wait for the first one, the parsed body then replaces the
+    LazyBody in ``proc_symbol``.
+    """
+    with _lock:
+        body = proc_symbol.body
+        if not isinstance(body, LazyBody):
+            return body
+        lexer = Lexer(body.text,
+                      metrics=body.analyzer_options['metrics'])
+        lexer.seek(body.start)
+        parser = Parser(lexer, lazy_functions=True)
+        compound = parser.compound_statement()
+        analyzer = SemanticAnalyzer(**body.analyzer_options)
+        analyzer.current_scope = body.scope
+        analyzer.analyze_body(proc_symbol, compound)
+        return compound
@@ -1,20 +1,31 @@
-from typing import Union
+from typing import TextIO, Union
 
 from enums import TokenType
 from errors import LexerError
-from tokens import Token, build_reserved_keywords
+from tokens import Token, SourceIndex, LineSource, build_reserved_keywords
 
 RESERVED_KEYWORDS = build_reserved_keywords()
 
 
 class Lexer(object):
-    def __init__(self, text: str):
+    def __init__(self, text: str, metrics=None):
         self.text: str = text
         self.pos: int = 0
         self.current_char: Union[str, None] = self.text[self.pos]
+        # Only offsets are tracked, lines and columns are looked up on demand.
+        self.source_index = SourceIndex(text)
 
-        self.lineno = 1
-        self.column = 1
+        self.metrics = metrics
+        if metrics is not None:
+            self.get_next_token = self._counting_get_next_token
+
+    @property
+    def lineno(self):
+        return self.source_index.position(self.pos)[0]
+
+    @property
+    def column(self):
+        return self.source_index.position(self.pos)[1]
 
     def error(self):
         s = "Lexer error on '{lexeme}' line: {lineno} column: {column}".format(
@@ -22,7 +33,7 @@ class Lexer(object):
             lineno=self.lineno,
             column=self.column,
         )
-        raise LexerError(message=s)
+        raise LexerError(message=s, lineno=self.lineno, column=self.column)
 
     def _id(self):
         result = ''
@@ -32,11 +43,11 @@ class Lexer(object):
 
         token = RESERVED_KEYWORDS.get(result)
         if token is None:
-            token = Token(TokenType.ID, result, lineno=self.lineno, column=self.column)
-            print(token)
+            token = Token(TokenType.ID, result, self.pos, self.source_index)
+            print(token.trace())
             return token
-        token = Token(token, result, lineno=self.lineno, column=self.column)
-        print(token)
+        token = Token(token, result, self.pos, self.source_index)
+        print(token.trace())
         return token
 
     def peek(self):
@@ -47,16 +58,43 @@ class Lexer(object):
             return self.text[peek_pos]
 
     def advance(self):
-        if self.current_char == '\n':
-            self.lineno += 1
-            self.column = 0
-
         self.pos += 1
         if self.pos > len(self.text) - 1:
             self.current_char = None  # Indicates end of input
         else:
             self.current_char = self.text[self.pos]
-            self.column += 1
+
+    def seek(self, offset: int):
+        self.pos = offset
+        if self.pos > len(self.text) - 1:
+            self.current_char = None
+        else:
+            self.current_char = self.text[self.pos]
+
+    def skip_block(self):
+        """Skip to after the brace closing the block opened before ``pos``.
+
+        Returns the offset of the closing brace or None when the text ends
+        first. Nothing inside the block is tokenized.
+        """
+        text = self.text
+        find = text.find
+        depth = 1
+        pos = self.pos
+        while depth:
+            close = find('}', pos)
+            if close == -1:
+                self.seek(len(text))
+                return None
+            opening = find('{', pos, close)
+            if opening == -1:
+                depth -= 1
+                pos = close + 1
+            else:
+                depth += 1
+                pos = opening + 1
+        self.seek(pos)
+        return pos - 1
 
     def skip_whitespace(self):
         while self.current_char is not None and self.current_char.isspace():
@@ -79,8 +117,8 @@ class Lexer(object):
                 return self._id()
 
             if self.current_char.isdigit():
-                return Token(TokenType.INTEGER, self.integer(),
-                             lineno=self.lineno, column=self.column)
+                return Token(TokenType.INTEGER, self.integer(), self.pos,
+                             self.source_index)
 
             try:
                 token_type = TokenType(self.current_char)
@@ -90,10 +128,52 @@ class Lexer(object):
                 token = Token(
                     token_type=token_type,
                     value=token_type.value,
-                    lineno=self.lineno,
-                    column=self.column
+                    offset=self.pos,
+                    source=self.source_index
                 )
                 self.advance()
-                print(token)
+                print(token.trace())
                 return token
-        return Token(TokenType.EOF, None)
+        return Token(TokenType.EOF, None, self.pos, self.source_index)
+
+    def _counting_get_next_token(self):
+        self.metrics.inc('tokens_lexed')
+        return type(self).get_next_token(self)
+
+
+class StreamLexer(Lexer):
+    """Lexer reading its text from a file one line at a time.
+
+    Tokens never span lines, so only the current line is kept. Token
+    offsets are relative to their line and every line is its own
+    LineSource.
+    """
+
+    def __init__(self, stream: TextIO, metrics=None):
+        self.stream = stream
+        self.lines_read = 0
+        self.metrics = metrics
+        if metrics is not None:
+            self.get_next_token = self._counting_get_next_token
+        self.next_line()
+
+    def next_line(self):
+        self.text = self.stream.readline()
+        self.lines_read += 1
+        self.source_index = LineSource(self.lines_read, self.text)
+        self.seek(0)
+
+    def advance(self):
+        self.pos += 1
+        if self.pos > len(self.text) - 1:
+            # Only the last line of a file may lack the newline.
+            if self.text.endswith('\n'):
+                self.next_line()
+            else:
+                self.current_char = None
+        else:
+            self.current_char = self.text[self.pos]
+
+    def skip_block(self):
+        raise LexerError(message='Blocks cannot be skipped when lexing a '
+                                 'stream')
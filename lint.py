@@ -0,0 +1,99 @@
+import argparse
+import contextlib
+import os
+import sys
+from typing import Union
+
+from analyzer import SemanticAnalyzer
+from dupa_parser import Parser
+from enums import TokenType
+from errors import PreInterpretError
+from lexer import Lexer
+from modules import ModuleBuilder, CACHE_DIRECTORY, find_imports
+from tokens import Token
+
+
+def lint(text: str, builder: Union[ModuleBuilder, None] = None) -> list:
+    """Syntax and semantic errors of a program, found in one pass over it.
+
+    The parser and the analyzer skip the statement an error is in and go
+    on, so an error may hide or cause others in the same statement only.
+    Without a builder imported modules are looked up in the working
+    directory.
+    """
+    parser = Parser(Lexer(text), recover=True)
+    tree = parser.parse()
+    errors = list(parser.errors)
+    if builder is None:
+        builder = ModuleBuilder(cache_dir=None)
+    try:
+        modules = builder.build(find_imports(text))
+    except PreInterpretError as e:
+        # Every call into the modules would be reported as well.
+        errors.append(e)
+        return errors
+    analyzer = SemanticAnalyzer(modules=modules, recover=True)
+    analyzer.visit(tree)
+    return errors + analyzer.errors
+
+
+def position(error: PreInterpretError) -> str:
+    """``line:column`` of an error, the line alone when the column is not
+    known and empty when neither is."""
+    token = error.token
+    if isinstance(token, Token) and token.lineno is not None:
+        lineno, column = token.position()
+        text = token.source.text.rstrip()
+        if token.token_type == TokenType.EOF and text:
+            # Past a trailing newline the position is on a line that is not
+            # there, the end of the last line is reported instead.
+            lineno, column = token.source.position(len(text) - 1)
+        return f'{lineno}:{column}'
+    if error.lineno is None:
+        return ''
+    if error.column is None:
+        return str(error.lineno)
+    return f'{error.lineno}:{error.column}'
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Report all syntax and semantic errors of DUPA programs '
+                    'without running them')
+    arg_parser.add_argument('files', nargs='+', metavar='file')
+    arg_parser.add_argument('-I', dest='include', action='append',
+                            default=[], metavar='DIR',
+                            help='also look for imported modules in DIR')
+    arg_parser.add_argument('--no-cache', action='store_true',
+                            help='do not cache compiled modules')
+    args = arg_parser.parse_args()
+
+    # Modules are looked up next to the program like in main.py, one
+    # builder per directory.
+    builders = {}
+    total = 0
+    for path in args.files:
+        base = os.path.dirname(os.path.abspath(path))
+        if base not in builders:
+            builders[base] = ModuleBuilder(
+                search_path=[base] + args.include,
+                cache_dir=None if args.no_cache else os.path.join(
+                    base, CACHE_DIRECTORY))
+        with open(path) as f:
+            text = f.read()
+        # The lexer, parser and analyzer trace to stdout.
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull):
+            errors = lint(text, builders[base])
+        for error in errors:
+            where = ':'.join(filter(None, (path, position(error))))
+            print(f'{where}: {error.__class__.__name__}: {error}')
+        total += len(errors)
+    for builder in builders.values():
+        builder.shutdown()
+    print(f'{total} errors in {len(args.files)} files', file=sys.stderr)
+    sys.exit(1 if total else 0)
+
+
+if __name__ == '__main__':
+    main()
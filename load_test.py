@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import time
+
+from client import DupaClient
+from main import text as SAMPLE_SOURCE
+from server import DEFAULT_HOST, DEFAULT_PORT
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+async def load_test(requests: int, connections: int, distinct: int,
+                    host: str, port: int, path: str):
+    # Every distinct program differs in a trailing declaration, so the
+    # server has to compile it once before it is served from the cache.
+    sources = [SAMPLE_SOURCE + f'int unique{i};\n' for i in range(distinct)]
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        async with DupaClient(host, port, path) as client:
+            for i in counter:
+                start = time.perf_counter()
+                response = await client.run(sources[i % distinct])
+                latencies.append(time.perf_counter() - start)
+                if not response.get('ok'):
+                    errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(connections)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f'requests:     {len(latencies)} ({errors} errors)')
+    print(f'connections:  {connections}')
+    print(f'elapsed:      {elapsed:.3f} s')
+    print(f'requests/sec: {len(latencies) / elapsed:.1f}')
+    print(f'p50 latency:  {percentile(latencies, 0.50) * 1000:.2f} ms')
+    print(f'p99 latency:  {percentile(latencies, 0.99) * 1000:.2f} ms')
+    print(f'max latency:  {latencies[-1] * 1000 if latencies else 0:.2f} ms')
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='DUPA server load test')
+    arg_parser.add_argument('--requests', type=int, default=2000)
+    arg_parser.add_argument('--connections', type=int, default=32)
+    arg_parser.add_argument('--distinct', type=int, default=1,
+                            help='number of distinct programs to send')
+    arg_parser.add_argument('--host', default=DEFAULT_HOST)
+    arg_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    arg_parser.add_argument('--unix', metavar='PATH')
+    args = arg_parser.parse_args()
+    asyncio.run(load_test(args.requests, args.connections, args.distinct,
+                          args.host, args.port, args.unix))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,18 @@
-from analyzer import SemanticAnalyzer
+import argparse
+import contextlib
+import io
+import os
+
 from interpreter import Interpreter
-from lexer import Lexer
+from lexer import Lexer, StreamLexer
 from dupa_parser import Parser
+from grammar import TableParser
+from hashcons import tree_footprint
+from metrics import Metrics
+from modules import ModuleBuilder, CACHE_DIRECTORY, find_imports
+from passes import PassManager, DEFAULT_OPT_LEVEL, MAX_OPT_LEVEL
+from pipeline import StreamingPipeline
+from repl import Repl
 from pprint import pprint
 
 text = """def int f()
@@ -25,19 +36,157 @@ do
 """
 
 
+def module_builder(args) -> ModuleBuilder:
+    base = os.path.dirname(os.path.abspath(args.file)) if args.file \
+        else os.getcwd()
+    return ModuleBuilder(
+        search_path=[base] + args.include,
+        opt_level=args.opt_level,
+        cache_dir=None if args.no_cache else os.path.join(
+            base, CACHE_DIRECTORY),
+        workers=args.jobs)
+
+
+def stream(args, metrics):
+    """Execute every top-level statement as soon as it is read."""
+    builder = module_builder(args)
+    with open(args.file) if args.file else io.StringIO(text) as source:
+        parser = Parser(StreamLexer(source, metrics=metrics),
+                        metrics=metrics)
+        pipeline = StreamingPipeline(metrics=metrics, builder=builder)
+        try:
+            pipeline.run(parser)
+        finally:
+            builder.shutdown()
+        pprint(pipeline.close())
+
+
+def interact(args, metrics):
+    builder = module_builder(args)
+    repl = Repl(builder=builder, metrics=metrics)
+    if args.file:
+        with open(args.file) as f:
+            repl.run(f.read())
+    try:
+        repl.interact()
+    finally:
+        repl.close()
+        builder.shutdown()
+
+
 def main():
+    arg_parser = argparse.ArgumentParser(description='DUPA interpreter')
+    arg_parser.add_argument('file', nargs='?',
+                            help='source file, the built-in demo if omitted')
+    arg_parser.add_argument('-O', dest='opt_level', type=int,
+                            default=DEFAULT_OPT_LEVEL,
+                            choices=range(MAX_OPT_LEVEL + 1),
+                            help='optimization level')
+    arg_parser.add_argument('--parser', default='descent',
+                            choices=('descent', 'table'),
+                            help='recursive descent or table-driven LL(1) '
+                                 'parser')
+    arg_parser.add_argument('--lazy', action='store_true',
+                            help='parse function bodies on their first call')
+    arg_parser.add_argument('--hash-cons', action='store_true',
+                            help='share structurally equal expressions in '
+                                 'the tree')
+    arg_parser.add_argument('--tree-stats', action='store_true',
+                            help='print the size of the parsed tree')
+    arg_parser.add_argument('--stream', action='store_true',
+                            help='run every top-level statement as soon as '
+                                 'it is parsed, without optimizing')
+    arg_parser.add_argument('--repl', action='store_true',
+                            help='read statements interactively, after '
+                                 'running the file if given')
+    arg_parser.add_argument('-I', dest='include', action='append',
+                            default=[], metavar='DIR',
+                            help='also look for imported modules in DIR')
+    arg_parser.add_argument('--jobs', type=int,
+                            help='processes compiling modules in parallel')
+    arg_parser.add_argument('--no-cache', action='store_true',
+                            help='do not cache compiled modules')
+    arg_parser.add_argument('--timings', action='store_true',
+                            help='print time spent in every compiler pass')
+    arg_parser.add_argument('--metrics', metavar='PATH',
+                            help='write runtime metrics to PATH')
+    arg_parser.add_argument('--metrics-format', default='json',
+                            choices=('json', 'prometheus'))
+    arg_parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                            help='serve runtime metrics over HTTP on PORT '
+                                 'until interrupted')
+    args = arg_parser.parse_args()
+    if (args.stream or args.repl) and (
+            args.parser == 'table' or args.lazy or args.hash_cons):
+        arg_parser.error('--stream and --repl need the descent parser, '
+                         'without --lazy and --hash-cons')
+    if args.hash_cons and args.parser == 'table':
+        arg_parser.error('--hash-cons needs the descent parser')
+
+    metrics = None
+    if args.metrics or args.metrics_port:
+        metrics = Metrics()
+
+    def phase(name):
+        if metrics is None:
+            return contextlib.nullcontext()
+        return metrics.time(name)
+
+    if args.stream:
+        with phase('execute'):
+            stream(args, metrics)
+        return report(args, metrics)
+    if args.repl:
+        interact(args, metrics)
+        return report(args, metrics)
+
+    source = text
+    if args.file:
+        with open(args.file) as f:
+            source = f.read()
+
     while True:
-        lexer = Lexer(text)
-        parser = Parser(lexer)
+        lexer = Lexer(source, metrics=metrics)
+        if args.parser == 'table':
+            parser = TableParser(lexer, metrics=metrics)
+        else:
+            parser = Parser(lexer, metrics=metrics,
+                            lazy_functions=args.lazy,
+                            hash_cons=args.hash_cons)
         print("GRAMMAR:")
         print(parser.get_grammar() + "\n" + "\n")
-        tree = parser.parse()
-        analyzer = SemanticAnalyzer()
-        analyzer.visit(tree)
-        interpreter = Interpreter(parser)
-        result = interpreter.interpret(tree)
+        with phase('parse'):
+            tree = parser.parse()
+        if args.tree_stats:
+            pprint(tree_footprint(tree))
+        builder = module_builder(args)
+        with phase('modules'):
+            modules = builder.build(find_imports(source))
+        builder.shutdown()
+        pass_manager = PassManager(args.opt_level, metrics=metrics,
+                                   modules=modules)
+        tree = pass_manager.run(tree)
+        if args.timings:
+            print(pass_manager.report())
+        interpreter = Interpreter(parser, metrics=metrics)
+        with phase('execute'):
+            result = interpreter.interpret(tree)
         pprint(interpreter.call_stack)
         break
+    report(args, metrics)
+
+
+def report(args, metrics):
+    if args.metrics:
+        metrics.write(args.metrics, args.metrics_format)
+    if args.metrics_port:
+        server = metrics.serve(port=args.metrics_port)
+        print(f'Serving metrics on http://127.0.0.1:{args.metrics_port}'
+              f'/metrics, press Ctrl+C to stop')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
 
 
 if __name__ == '__main__':
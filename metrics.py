@@ -0,0 +1,193 @@
+import bisect
+import contextlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COUNTERS = {
+    'tokens_lexed': 'Tokens produced by the lexer.',
+    'nodes_parsed': 'Nodes in the trees built by the parser.',
+    'symbols_defined': 'Symbols defined in symbol tables.',
+    'symbols_looked_up': 'Symbol table lookups.',
+    'statements_executed': 'Statements executed by the interpreter.',
+    'calls': 'Function calls.',
+    'loop_iterations': 'Loop iterations.',
+    'nodes_shared': 'Parsed nodes replaced by an equal earlier node.',
+    'statements_streamed': 'Top-level statements run by the streaming '
+                           'pipeline.',
+}
+
+GAUGES = {
+    'call_stack_peak_depth': 'Deepest call stack seen.',
+}
+
+HISTOGRAMS = {
+    'phase_duration_seconds': 'Time spent in a pipeline phase.',
+}
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics(object):
+    """Counters, gauges and histograms of one or more interpreter runs.
+
+    Components take an optional ``metrics`` argument and do not record
+    anything, nor pay for checks in their hot paths, when it is None.
+    """
+
+    def __init__(self, prefix: str = 'dupa_'):
+        self.prefix = prefix
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.gauges = dict.fromkeys(GAUGES, 0)
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, amount: int = 1):
+        # Worker threads of the server share one Metrics.
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_max(self, name: str, value):
+        with self._lock:
+            if value > self.gauges.get(name, 0):
+                self.gauges[name] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextlib.contextmanager
+    def time(self, phase: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('phase_duration_seconds',
+                         time.perf_counter() - start, phase=phase)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            histograms = [
+                {
+                    'name': name,
+                    'labels': dict(labels),
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'buckets': {str(bound): count for bound, count
+                                in histogram.cumulative()},
+                }
+                for (name, labels), histogram in self.histograms.items()
+            ]
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+        return {
+            'counters': counters,
+            'gauges': gauges,
+            'histograms': histograms,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format, version 0.0.4."""
+        lines = []
+        with self._lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = sorted(self.histograms.items())
+        for name, value in counters.items():
+            metric = f'{self.prefix}{name}_total'
+            lines.append(f'# HELP {metric} {COUNTERS.get(name, name)}')
+            lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric} {value}')
+        for name, value in gauges.items():
+            metric = f'{self.prefix}{name}'
+            lines.append(f'# HELP {metric} {GAUGES.get(name, name)}')
+            lines.append(f'# TYPE {metric} gauge')
+            lines.append(f'{metric} {value}')
+        described = set()
+        for (name, labels), histogram in histograms:
+            metric = f'{self.prefix}{name}'
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP {metric} {HISTOGRAMS.get(name, name)}')
+                lines.append(f'# TYPE {metric} histogram')
+            label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+            separator = ',' if label_text else ''
+            for bound, count in histogram.cumulative():
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{metric}_bucket{{{label_text}{separator}'
+                             f'le="{le}"}} {count}')
+            lines.append(f'{metric}_sum{{{label_text}}} {histogram.sum}')
+            lines.append(f'{metric}_count{{{label_text}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str, output_format: str = 'json'):
+        if output_format == 'json':
+            text = self.to_json()
+        elif output_format == 'prometheus':
+            text = self.to_prometheus()
+        else:
+            raise ValueError(f'Unknown metrics format {output_format!r}')
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def serve(self, host: str = '127.0.0.1', port: int = 9464):
+        """Expose /metrics (Prometheus) and /metrics.json on a local port.
+
+        The server runs on a daemon thread, call ``shutdown()`` on the
+        returned server to stop it.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body = metrics.to_prometheus().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body = metrics.to_json().encode('utf-8')
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        thread = threading.Thread(target=server.serve_forever,
+                                  name='dupa-metrics', daemon=True)
+        thread.start()
+        return server
@@ -0,0 +1,239 @@
+import ast
+import contextlib
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+
+from dupa_parser import Parser
+from enums import ErrorCode
+from errors import ModuleError, PreInterpretError
+from lexer import Lexer
+from nodes import DupaCall
+from passes import PassManager, DEFAULT_OPT_LEVEL
+from symbols import ScopedSymbolTable
+
+MODULE_SUFFIX = '.dupa'
+CACHE_DIRECTORY = '__dupacache__'
+# Part of every cache key, bump when the pickled exports change shape.
+CACHE_VERSION = '4'
+
+IMPORT_PATTERN = re.compile(r'\bimport\s+([A-Za-z][A-Za-z0-9]*)\s*;')
+
+
+def find_imports(text: str):
+    """Names imported by a source text, in order of first appearance."""
+    return list(dict.fromkeys(IMPORT_PATTERN.findall(text)))
+
+
+class ModuleBuilder(object):
+    """Compiles the modules a program imports, each into its own export.
+
+    A module is a ``<name>.dupa`` file on ``search_path`` holding only
+    function definitions and imports. Its export is a ScopedSymbolTable of
+    the functions it defines. Modules are compiled in waves, every module
+    after all of its imports and the modules of one wave in parallel worker
+    processes. Exports are cached on disk under a key hashing the source,
+    the optimization level and the keys of the imported modules, so editing
+    a module rebuilds it and its dependents only.
+    """
+
+    def __init__(self, search_path=('.',), opt_level: int = DEFAULT_OPT_LEVEL,
+                 cache_dir: Union[str, None] = CACHE_DIRECTORY,
+                 workers: Union[int, None] = None):
+        self.search_path = list(search_path)
+        self.opt_level = opt_level
+        self.cache_dir = cache_dir
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.stats = {'modules': 0, 'compiled': 0, 'cached': 0, 'waves': 0}
+        self._executor: Union[ProcessPoolExecutor, None] = None
+
+    def find(self, name: str) -> str:
+        for directory in self.search_path:
+            path = os.path.join(directory, name + MODULE_SUFFIX)
+            if os.path.isfile(path):
+                return path
+        raise ModuleError(error_code=ErrorCode.MODULE_NOT_FOUND, token=name,
+                          message=f'{ErrorCode.MODULE_NOT_FOUND.value} -> '
+                                  f'{name}')
+
+    def discover(self, names):
+        """Sources and imports of ``names`` and everything they import."""
+        sources = {}
+        imports = {}
+        pending = list(names)
+        while pending:
+            name = pending.pop()
+            if name in sources:
+                continue
+            with open(self.find(name)) as f:
+                sources[name] = f.read()
+            imports[name] = find_imports(sources[name])
+            pending.extend(imports[name])
+        return sources, imports
+
+    @staticmethod
+    def waves(imports: dict):
+        """Modules grouped so every module comes after all of its imports."""
+        remaining = dict(imports)
+        done = set()
+        waves = []
+        while remaining:
+            wave = sorted(name for name, needed in remaining.items()
+                          if done.issuperset(needed))
+            if not wave:
+                name = min(remaining)
+                raise ModuleError(error_code=ErrorCode.IMPORT_CYCLE,
+                                  token=name,
+                                  message=f'{ErrorCode.IMPORT_CYCLE.value} '
+                                          f'-> {name}')
+            for name in wave:
+                del remaining[name]
+            done.update(wave)
+            waves.append(wave)
+        return waves
+
+    def build(self, names) -> dict:
+        """Exports of ``names`` and of their imports, by module name."""
+        sources, imports = self.discover(names)
+        keys = {}
+        exports = {}
+        for wave in self.waves(imports):
+            self.stats['waves'] += 1
+            compile_jobs = []
+            for name in wave:
+                key = hashlib.sha256('\0'.join(
+                    [CACHE_VERSION, str(self.opt_level), name, sources[name]]
+                    + [keys[dependency]
+                       for dependency in sorted(imports[name])]
+                ).encode('utf-8')).hexdigest()
+                keys[name] = key
+                export = self._load(name, key)
+                if export is None:
+                    compile_jobs.append((name, key))
+                else:
+                    self.stats['cached'] += 1
+                    exports[name] = export
+            for (name, key), export in zip(compile_jobs, self._compile_all(
+                    compile_jobs, sources, imports, exports)):
+                self.stats['compiled'] += 1
+                self._store(name, key, export)
+                exports[name] = export
+        self.stats['modules'] += len(exports)
+        link(exports)
+        return exports
+
+    def _compile_all(self, compile_jobs, sources, imports, exports):
+        arguments = [
+            (name, sources[name],
+             {dependency: exports[dependency]
+              for dependency in imports[name]},
+             self.opt_level)
+            for name, _ in compile_jobs
+        ]
+        if len(arguments) < 2 or self.workers < 2:
+            return [compile_module(*argument) for argument in arguments]
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return list(self._executor.map(_compile_quietly, arguments))
+
+    def _cache_path(self, name: str, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{name}-{key}.pickle')
+
+    def _load(self, name: str, key: str):
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._cache_path(name, key), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _store(self, name: str, key: str, export: ScopedSymbolTable):
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        prefix = f'{name}-'
+        for file_name in os.listdir(self.cache_dir):
+            # Entries of older versions of the module.
+            if file_name.startswith(prefix) and \
+                    len(file_name) == len(prefix) + 64 + len('.pickle'):
+                os.remove(os.path.join(self.cache_dir, file_name))
+        descriptor, temporary = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(descriptor, 'wb') as f:
+            pickle.dump(export, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, self._cache_path(name, key))
+
+    def compile_program(self, text: str, parser_class=Parser, metrics=None):
+        """Parse and analyze a program together with the modules it imports.
+
+        Returns the tree and the PassManager which compiled it.
+        """
+        modules = self.build(find_imports(text))
+        tree = parser_class(Lexer(text, metrics=metrics),
+                            metrics=metrics).parse()
+        pass_manager = PassManager(self.opt_level, metrics=metrics,
+                                   modules=modules)
+        return pass_manager.run(tree), pass_manager
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def compile_module(name: str, text: str, modules: dict,
+                   opt_level: int = DEFAULT_OPT_LEVEL) -> ScopedSymbolTable:
+    """Parse, analyze and optimize one module into its export table."""
+    try:
+        tree = Parser(Lexer(text)).parse()
+        for node in tree.body:
+            if not isinstance(node, (ast.FunctionDef, ast.Import)):
+                raise ModuleError(
+                    error_code=ErrorCode.MODULE_STATEMENT,
+                    token=node.__class__.__name__,
+                    message=f'{ErrorCode.MODULE_STATEMENT.value} -> '
+                            f'{node.__class__.__name__}')
+        pass_manager = PassManager(opt_level, modules=modules)
+        pass_manager.run(tree)
+    except PreInterpretError as e:
+        e.args = (f'{name}: {e}',)
+        raise
+    global_scope = pass_manager.context.global_scope
+    export = ScopedSymbolTable(scope_name=name, scope_level=1)
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef):
+            symbol = global_scope.lookup(node.name, current_scope_only=True)
+            symbol.module = name
+            export.define(symbol)
+    return export
+
+
+def _compile_quietly(arguments):
+    with open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull):
+        return compile_module(*arguments)
+
+
+def link(exports: dict):
+    """Point calls into other modules at the symbols in ``exports``.
+
+    Modules compiled in other processes or loaded from the cache call copies
+    of the symbols of their imports, linking replaces them so every function
+    has a single symbol, which tiering and frame pools are keyed by.
+    """
+    for export in exports.values():
+        for symbol in export.procedures():
+            for node in ast.walk(symbol.body):
+                if not isinstance(node, DupaCall):
+                    continue
+                callee = node.proc_symbol
+                if callee.module is None or callee.module not in exports:
+                    continue
+                canonical = exports[callee.module].lookup(
+                    callee.name, current_scope_only=True)
+                if canonical is not None:
+                    node.proc_symbol = canonical
@@ -0,0 +1,98 @@
+import math
+import operator
+from typing import Callable, Union
+
+from enums import VariableTypes
+from symbols import BuiltinTypeSymbol, NativeProcedureSymbol, \
+    ScopedSymbolTable, VarSymbol
+
+
+class BuiltinRegistry(object):
+    """Python callables exposed to DUPA programs as functions.
+
+    ``params`` lists ``(name, VariableTypes)`` pairs, ``returns`` is a
+    ``VariableTypes`` member or None for functions without a result.
+    """
+
+    def __init__(self):
+        self._symbols = {}
+
+    def __contains__(self, name: str):
+        return name in self._symbols
+
+    def __iter__(self):
+        return iter(self._symbols.values())
+
+    def register(self, name: str, params=(),
+                 returns: Union[VariableTypes, None] = None,
+                 function: Callable = None):
+        if function is None:
+            def decorator(f):
+                self.register(name, params, returns, f)
+                return f
+            return decorator
+
+        param_symbols = [
+            VarSymbol(param_name, BuiltinTypeSymbol(str(param_type)))
+            for param_name, param_type in params
+        ]
+        self._symbols[name] = NativeProcedureSymbol(
+            name, function, params=param_symbols, returns=returns)
+        return function
+
+    def unregister(self, name: str):
+        del self._symbols[name]
+
+    def define_all(self, scope: ScopedSymbolTable):
+        for symbol in self._symbols.values():
+            scope.define(symbol)
+
+
+default_registry = BuiltinRegistry()
+
+
+def register_builtin(name: str, params=(),
+                     returns: Union[VariableTypes, None] = None):
+    """Decorator registering a function in the default registry."""
+    return default_registry.register(name, params, returns)
+
+
+@register_builtin('abs', [('x', VariableTypes.UNIVERSAL)],
+                  VariableTypes.UNIVERSAL)
+def _abs(x):
+    return abs(x)
+
+
+@register_builtin('sqrt', [('x', VariableTypes.FLOAT)], VariableTypes.FLOAT)
+def _sqrt(x):
+    return math.sqrt(x)
+
+
+@register_builtin('floor', [('x', VariableTypes.FLOAT)],
+                  VariableTypes.INTEGER)
+def _floor(x):
+    return math.floor(x)
+
+
+@register_builtin('sum', [('a', VariableTypes.FLOAT_ARRAY)],
+                  VariableTypes.FLOAT)
+def _sum(a):
+    return math.fsum(a)
+
+
+@register_builtin('dot', [('a', VariableTypes.FLOAT_ARRAY),
+                          ('b', VariableTypes.FLOAT_ARRAY)],
+                  VariableTypes.FLOAT)
+def _dot(a, b):
+    if len(a) != len(b):
+        raise ValueError('dot of arrays with different lengths')
+    return math.fsum(map(operator.mul, a, b))
+
+
+@register_builtin('fill', [('a', VariableTypes.FLOAT_ARRAY),
+                           ('value', VariableTypes.UNIVERSAL)])
+def _fill(a, value):
+    if a.format == 'q':
+        value = int(value)
+    for index in range(len(a)):
+        a[index] = value
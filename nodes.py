@@ -40,26 +40,110 @@ class Param(VariableStructure):
     pass
 
 
+class ArrayDeclaration(Declaration):
+    # noinspection PyMissingConstructor
+    def __init__(self, id=None, type=None, size=None):
+        self.id = id
+        self.type = type
+        self.size = size
+
+    _fields = (
+        'id',
+        'type',
+        'size'
+    )
+
+
+class ArrayLength(ast.expr):
+    def __init__(self, value=None):
+        super(ArrayLength, self).__init__()
+        self.value = value
+
+    _fields = (
+        'value',
+    )
+
+
 class DupaCall(ast.expr):
-    def __init__(self, func, args=None, keywords=None, proc_symbol=None):
+    def __init__(self, func=None, args=None, keywords=None, proc_symbol=None):
         super(DupaCall, self).__init__()
         self.func = func
         self.args = args
         self.keywords = keywords
         self.proc_symbol = proc_symbol
 
+    _fields = (
+        'func',
+        'args'
+    )
+
 
 class IterFor(ast.stmt):
-    def __init__(self, expr1, expr2, expr3, body):
+    def __init__(self, expr1=None, expr2=None, expr3=None, body=None):
         super(IterFor, self).__init__()
         self.expr1 = expr1
         self.expr2 = expr2
         self.expr3 = expr3
         self.body = body
 
+    _fields = (
+        'expr1',
+        'expr2',
+        'expr3',
+        'body'
+    )
+
 
 class DoWhile(ast.stmt):
-    def __init__(self, test, body):
+    def __init__(self, test=None, body=None):
         super(DoWhile, self).__init__()
         self.test = test
-        self.body = body
\ No newline at end of file
+        self.body = body
+
+    _fields = (
+        'test',
+        'body'
+    )
+
+
+class ParFor(ast.stmt):
+    def __init__(self, target=None, start=None, stop=None, body=None):
+        super(ParFor, self).__init__()
+        self.target = target
+        self.start = start
+        self.stop = stop
+        self.body = body
+        # Filled in by the semantic analysis.
+        self.reductions = {}
+        self.written_arrays = []
+        # Name -> scope level of the variables outside of their frames read
+        # by called functions, None when unknown and the loop runs serially.
+        self.shared_reads = {}
+        # Variables declared in the body, dropped after the loop.
+        self.private = []
+
+    _fields = (
+        'target',
+        'start',
+        'stop',
+        'body'
+    )
+
+
+class LazyBody(ast.stmt):
+    """Function body which was only brace-matched by the parser.
+
+    ``start`` and ``end`` are the offsets of its braces in ``text``. The
+    analyzer stores the scope the function was defined in and the options
+    to analyze the body with once it is parsed.
+    """
+
+    def __init__(self, text=None, start=None, end=None):
+        super(LazyBody, self).__init__()
+        self.text = text
+        self.start = start
+        self.end = end
+        self.scope = None
+        self.analyzer_options = None
+
+    _fields = ()
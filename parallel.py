@@ -0,0 +1,144 @@
+import ast
+import contextlib
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+
+from containers import ActivationRecord
+from enums import ARType
+from nodes import DupaCall, ParFor
+
+DEFAULT_MIN_ITERATIONS = 10000
+
+IDENTITIES = {'+': 0, '*': 1}
+
+
+class ParallelLoops(object):
+    """Runs the iterations of parfor loops on a pool of worker processes.
+
+    The iteration range is split into one contiguous chunk per worker. Every
+    chunk gets a copy of the variables the body and the functions it calls
+    use, whatever activation record of the display they are in, reductions
+    start from their identity in each chunk and are combined in chunk order
+    afterwards,
+    written arrays are sent back as the slice the chunk wrote. Loops shorter
+    than ``min_iterations`` are not worth the round trip and run serially.
+    """
+
+    def __init__(self, workers: Union[int, None] = None,
+                 min_iterations: int = DEFAULT_MIN_ITERATIONS):
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.min_iterations = min_iterations
+        self.stats = {'parallel_loops': 0, 'serial_loops': 0, 'chunks': 0}
+        self._executor: Union[ProcessPoolExecutor, None] = None
+
+    def run(self, node: ParFor, display, start: int, stop: int) -> bool:
+        """Execute the loop in the workers, False if it has to run serially."""
+        if self.workers <= 1 or stop - start < self.min_iterations \
+                or start < 0 or node.shared_reads is None:
+            self.stats['serial_loops'] += 1
+            return False
+        callees = {id(child.func) for child in ast.walk(node.body)
+                   if isinstance(child, DupaCall)}
+        levels = {child.id: child.scope_level for child in ast.walk(node.body)
+                  if isinstance(child, ast.Name) and id(child) not in callees}
+        for name, level in node.shared_reads.items():
+            if levels.setdefault(name, level) != level:
+                # Both variables would be merged into one record.
+                self.stats['serial_loops'] += 1
+                return False
+        environment = {name: display[level][name]
+                       for name, level in levels.items()
+                       if name in display[level].members
+                       and name != node.target}
+        try:
+            payload = pickle.dumps((node.body, environment),
+                                   protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            # Bodies calling natives registered as lambdas or closures.
+            self.stats['serial_loops'] += 1
+            return False
+
+        nesting_level = max([node.scope_level] + list(levels.values()))
+        with _lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            executor = self._executor
+        bounds = [start + (stop - start) * index // self.workers
+                  for index in range(self.workers + 1)]
+        futures = [
+            executor.submit(_run_chunk, payload, node.target, nesting_level,
+                            chunk_start, chunk_stop, node.reductions,
+                            node.written_arrays)
+            for chunk_start, chunk_stop in zip(bounds, bounds[1:])
+            if chunk_start < chunk_stop
+        ]
+        results = [future.result() for future in futures]
+
+        for name, operator in node.reductions.items():
+            ar = display[levels[name]]
+            value = ar[name]
+            for partials, _ in results:
+                if operator == '+':
+                    value = value + partials[name]
+                else:
+                    value = value * partials[name]
+            ar[name] = value
+        for _, slices in results:
+            for name, (chunk_start, values) in slices.items():
+                display[levels[name]][name][
+                    chunk_start:chunk_start + len(values)] = values
+        self.stats['parallel_loops'] += 1
+        self.stats['chunks'] += len(futures)
+        return True
+
+    def shutdown(self):
+        with _lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+_default_loops: Union[ParallelLoops, None] = None
+# Guards the lazy creation of the default loops and of the pools, server
+# workers can reach a parfor at the same time.
+_lock = threading.Lock()
+
+
+def default_loops() -> ParallelLoops:
+    """Process wide ParallelLoops, its pool is started on first use."""
+    global _default_loops
+    with _lock:
+        if _default_loops is None:
+            _default_loops = ParallelLoops()
+        return _default_loops
+
+
+def _run_chunk(payload: bytes, target: str, nesting_level: int, start: int,
+               stop: int, reductions: dict, written_arrays: list):
+    from interpreter import Interpreter
+
+    body, environment = pickle.loads(payload)
+    for name, operator in reductions.items():
+        environment[name] = IDENTITIES[operator]
+    ar = ActivationRecord(
+        name='parfor',
+        type_of=ARType.PARFOR_CHUNK,
+        nesting_level=nesting_level
+    )
+    ar.members = environment
+    interpreter = Interpreter(None, parallel=ParallelLoops(workers=1))
+    interpreter.call_stack.push(ar)
+    # Variables of every level were merged into one record.
+    interpreter.display = [None] + [ar] * nesting_level
+    with open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull):
+        for index in range(start, stop):
+            environment[target] = index
+            interpreter.visit(body)
+    partials = {name: environment[name] for name in reductions}
+    slices = {name: (start, environment[name][start:stop])
+              for name in written_arrays}
+    return partials, slices
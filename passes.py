@@ -0,0 +1,501 @@
+import abc
+import ast
+import copy
+import time
+from collections import Counter
+from typing import Any, Union
+
+from analyzer import SemanticAnalyzer
+from enums import VariableTypes
+from nodes import Compound, Declaration, DupaCall
+from visitors import DispatchVisitor
+
+DEFAULT_OPT_LEVEL = 1
+MAX_OPT_LEVEL = 2
+# Names of the temporaries of CommonSubexpressionEliminator, DUPA
+# identifiers cannot contain underscores.
+TEMPORARY_PREFIX = '__cse'
+
+
+class PassContext(object):
+    """State shared by the passes of one pipeline run."""
+
+    def __init__(self, opt_level: int, metrics=None, modules=None):
+        self.opt_level = opt_level
+        self.metrics = metrics
+        self.modules = modules
+        self.global_scope = None
+        self.timings = []
+        self.results = {}
+
+
+class Pass(abc.ABC):
+    """Single step of the compiler pipeline.
+
+    A pass runs when the pipeline's optimization level is at least
+    ``min_level``. ``run`` may return a new tree, which replaces the old one.
+    """
+    name = None
+    min_level = 0
+
+    @abc.abstractmethod
+    def run(self, tree: ast.Module, context: PassContext) -> Any:
+        pass
+
+
+class AnalysisPass(DispatchVisitor, Pass):
+    """Read-only pass which can share a tree walk with other analyses.
+
+    The walk calls ``visit_<Node>`` before and ``leave_<Node>`` after the
+    children of a node, the pass itself does not control the traversal.
+    ``finish`` returns the result stored in ``PassContext.results``.
+    """
+    fusable = True
+
+    def begin(self, tree: ast.Module, context: PassContext):
+        pass
+
+    def finish(self, context: PassContext) -> Any:
+        return None
+
+    def generic_visit(self, node):
+        pass
+
+    def run(self, tree: ast.Module, context: PassContext):
+        FusedWalk([self]).run(tree, context)
+
+
+class FusedWalk(Pass):
+    """Runs several analysis passes in one pre/post-order tree walk."""
+
+    def __init__(self, analyses):
+        self.analyses = list(analyses)
+        self.name = '+'.join(analysis.name for analysis in self.analyses)
+
+    def run(self, tree: ast.Module, context: PassContext):
+        elapsed = {}
+        for analysis in self.analyses:
+            start = time.perf_counter()
+            analysis.begin(tree, context)
+            elapsed[analysis] = time.perf_counter() - start
+        # Resolve hooks once per node type instead of once per node.
+        hooks = {}
+        stack = [(tree, False)]
+        perf_counter = time.perf_counter
+        while stack:
+            node, leaving = stack.pop()
+            node_type = node.__class__
+            calls = hooks.get(node_type)
+            if calls is None:
+                calls = hooks[node_type] = (
+                    [(analysis, analysis.lookup(node_type, 'visit_'))
+                     for analysis in self.analyses
+                     if analysis.lookup(node_type, 'visit_')
+                     is not AnalysisPass.generic_visit],
+                    [(analysis, analysis.lookup(node_type, 'leave_', None))
+                     for analysis in self.analyses
+                     if analysis.lookup(node_type, 'leave_', None)
+                     is not None],
+                )
+            for analysis, hook in calls[1 if leaving else 0]:
+                start = perf_counter()
+                hook(analysis, node)
+                elapsed[analysis] += perf_counter() - start
+            if leaving:
+                continue
+            if calls[1]:
+                stack.append((node, True))
+            children = list(ast.iter_child_nodes(node))
+            stack.extend((child, False) for child in reversed(children))
+        for analysis in self.analyses:
+            start = time.perf_counter()
+            context.results[analysis.name] = analysis.finish(context)
+            elapsed[analysis] += time.perf_counter() - start
+            context.timings.append((analysis.name, elapsed[analysis]))
+
+
+class SemanticAnalysisPass(Pass):
+    name = 'semantic-analysis'
+
+    def run(self, tree: ast.Module, context: PassContext):
+        analyzer = SemanticAnalyzer(metrics=context.metrics,
+                                    modules=context.modules)
+        analyzer.visit(tree)
+        context.global_scope = analyzer.global_scope
+
+
+class NodeStatisticsPass(AnalysisPass):
+    """Counts the nodes of every type."""
+    name = 'node-statistics'
+
+    def begin(self, tree: ast.Module, context: PassContext):
+        self.counts = Counter()
+
+    def generic_visit(self, node):
+        self.counts[node.__class__.__name__] += 1
+
+    def finish(self, context: PassContext):
+        return dict(self.counts)
+
+
+class CallGraphPass(AnalysisPass):
+    """Maps every function, and ``<module>``, to the functions it calls."""
+    name = 'call-graph'
+
+    def begin(self, tree: ast.Module, context: PassContext):
+        self.graph = {'<module>': set()}
+        self.functions = ['<module>']
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self.functions.append(node.name)
+        self.graph.setdefault(node.name, set())
+
+    def leave_FunctionDef(self, node: ast.FunctionDef):
+        self.functions.pop()
+
+    def visit_DupaCall(self, node: DupaCall):
+        self.graph[self.functions[-1]].add(node.func.id)
+
+    def finish(self, context: PassContext):
+        return self.graph
+
+
+class ConstantFolder(DispatchVisitor, ast.NodeTransformer):
+    def __init__(self):
+        self.folded = 0
+
+    @staticmethod
+    def _constant(node):
+        if isinstance(node, ast.Constant) and isinstance(
+                node.value, (int, float)):
+            return node.value
+        return None
+
+    def visit_BinOp(self, node: ast.BinOp):
+        self.generic_visit(node)
+        left = self._constant(node.left)
+        right = self._constant(node.right)
+        if left is None or right is None:
+            return node
+        if isinstance(node.op, ast.Add):
+            value = left + right
+        elif isinstance(node.op, ast.Sub):
+            value = left - right
+        elif isinstance(node.op, ast.Mult):
+            value = left * right
+        elif isinstance(node.op, ast.Div) and right != 0:
+            value = left / right
+        else:
+            return node
+        self.folded += 1
+        return ast.Num(value)
+
+    def visit_UnaryOp(self, node: ast.UnaryOp):
+        self.generic_visit(node)
+        operand = self._constant(node.operand)
+        if operand is None:
+            return node
+        self.folded += 1
+        if isinstance(node.op, ast.USub):
+            return ast.Num(-operand)
+        return ast.Num(+operand)
+
+
+class ConstantFoldingPass(Pass):
+    name = 'constant-folding'
+    min_level = 1
+
+    def run(self, tree: ast.Module, context: PassContext):
+        folder = ConstantFolder()
+        folder.visit(tree)
+        context.results[self.name] = folder.folded
+
+
+class DeadCodeEliminator(DispatchVisitor, ast.NodeTransformer):
+    TERMINATORS = (ast.Return, ast.Break, ast.Continue)
+
+    def __init__(self):
+        self.removed = 0
+
+    def _prune(self, body):
+        result = []
+        for index, child in enumerate(body):
+            child = self.visit(child)
+            if isinstance(child, ast.Pass):
+                self.removed += 1
+                continue
+            result.append(child)
+            if isinstance(child, self.TERMINATORS):
+                self.removed += len(body) - index - 1
+                break
+        return result
+
+    def visit_Module(self, node: ast.Module):
+        node.body = self._prune(node.body)
+        return node
+
+    def visit_Compound(self, node: Compound):
+        node.body = self._prune(node.body)
+        return node
+
+    def visit_If(self, node: ast.If):
+        self.generic_visit(node)
+        if not isinstance(node.test, ast.Constant):
+            return node
+        self.removed += 1
+        if node.test.value:
+            return node.body
+        if node.orelse is not None:
+            return node.orelse
+        return ast.Pass()
+
+    def visit_While(self, node: ast.While):
+        self.generic_visit(node)
+        if isinstance(node.test, ast.Constant) and not node.test.value:
+            self.removed += 1
+            return ast.Pass()
+        return node
+
+
+class DeadCodeEliminationPass(Pass):
+    name = 'dead-code-elimination'
+    min_level = 2
+
+    def run(self, tree: ast.Module, context: PassContext):
+        eliminator = DeadCodeEliminator()
+        eliminator.visit(tree)
+        context.results[self.name] = eliminator.removed
+
+
+class CommonSubexpressionEliminator(DispatchVisitor):
+    """Computes repeated expressions of straight-line code once.
+
+    Within one block, structurally identical ``BinOp`` trees built only of
+    names, constants and arithmetic are available until one of their
+    operands is assigned or declared again. Statements calling functions
+    and nested control flow end every available expression. An expression
+    occurring more than once is assigned to a ``__cse<n>`` temporary just
+    before its first occurrence. Changed statements are copied, not
+    modified in place.
+    """
+    SIMPLE_STATEMENTS = (ast.Assign, Declaration, ast.Return)
+    PURE_NODES = (ast.BinOp, ast.UnaryOp, ast.Name, ast.Constant,
+                  ast.operator, ast.unaryop)
+
+    def __init__(self):
+        self.eliminated = 0
+        self.temporaries = 0
+        self.proc_symbol = None
+        # Scope level of the temporaries of the block being rewritten.
+        self.scope_level = 1
+
+    def visit_Module(self, node: ast.Module):
+        node.body = self._block(node.body)
+
+    def visit_Compound(self, node: Compound):
+        node.body = self._block(node.body)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        outer = self.proc_symbol, self.scope_level
+        self.proc_symbol = getattr(node, 'proc_symbol', None)
+        self.scope_level += 1
+        self.visit(node.body)
+        self.proc_symbol, self.scope_level = outer
+
+    def _block(self, body):
+        groups = []
+        available = {}
+        operands = {}
+
+        def end(keys):
+            for key in keys:
+                groups.append(available.pop(key))
+
+        for index, statement in enumerate(body):
+            if not isinstance(statement, self.SIMPLE_STATEMENTS) or any(
+                    isinstance(child, DupaCall)
+                    for child in ast.walk(statement)):
+                self.visit(statement)
+                end(list(available))
+                continue
+            for child in ast.walk(statement):
+                if isinstance(child, ast.BinOp) and self._pure(child):
+                    key = ast.dump(child)
+                    available.setdefault(key, []).append((index, child))
+                    operands[key] = {name.id for name in ast.walk(child)
+                                     if isinstance(name, ast.Name)}
+            written = self._written(statement)
+            if written is not None:
+                end([key for key in available if written in operands[key]])
+        end(list(available))
+
+        # Keyed by statement index and node, a hash-consed tree shares
+        # nodes between statements and groups.
+        substitutions = {}
+        definitions = {}
+        replaced = set()
+        groups.sort(key=lambda group: -sum(1 for _ in ast.walk(group[0][1])))
+        for group in groups:
+            live = [(index, node) for index, node in group
+                    if (index, id(node)) not in replaced]
+            if len(live) < 2:
+                continue
+            name = f'{TEMPORARY_PREFIX}{self.temporaries}'
+            self.temporaries += 1
+            self.eliminated += len(live) - 1
+            for index, node in live:
+                substitutions.setdefault(index, {})[id(node)] = name
+                replaced.update((index, id(child))
+                                for child in ast.walk(node))
+            index, node = live[0]
+            definitions.setdefault(index, []).append((name, node))
+            if self.proc_symbol is not None:
+                self.proc_symbol.local_names.append(name)
+        if not substitutions:
+            return body
+
+        result = []
+        for index, statement in enumerate(body):
+            for name, node in definitions.get(index, ()):
+                result.append(Declaration(name, VariableTypes.UNIVERSAL))
+                result.append(ast.Assign([self._temporary(name)], node))
+            if index in substitutions:
+                statement = self._substitute(statement, substitutions[index])
+            result.append(statement)
+        return result
+
+    def _temporary(self, name: str) -> ast.Name:
+        node = ast.Name(name)
+        node.scope_level = self.scope_level
+        return node
+
+    def _pure(self, node) -> bool:
+        has_name = False
+        for child in ast.walk(node):
+            if not isinstance(child, self.PURE_NODES):
+                return False
+            if isinstance(child, ast.Name):
+                has_name = True
+        return has_name
+
+    @staticmethod
+    def _written(statement):
+        if isinstance(statement, Declaration):
+            return statement.id
+        if isinstance(statement, ast.Assign) and \
+                isinstance(statement.targets[0], ast.Name):
+            return statement.targets[0].id
+        return None
+
+    def _substitute(self, node, substitutions: dict):
+        name = substitutions.get(id(node))
+        if name is not None:
+            return self._temporary(name)
+        changes = {}
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, ast.AST):
+                new_value = self._substitute(value, substitutions)
+                if new_value is not value:
+                    changes[field] = new_value
+            elif isinstance(value, list):
+                new_value = [
+                    self._substitute(item, substitutions)
+                    if isinstance(item, ast.AST) else item
+                    for item in value
+                ]
+                if any(new is not old for new, old in zip(new_value, value)):
+                    changes[field] = new_value
+        if not changes:
+            return node
+        node = copy.copy(node)
+        for field, value in changes.items():
+            setattr(node, field, value)
+        return node
+
+
+class CommonSubexpressionEliminationPass(Pass):
+    name = 'common-subexpression-elimination'
+    min_level = 2
+
+    def run(self, tree: ast.Module, context: PassContext):
+        eliminator = CommonSubexpressionEliminator()
+        eliminator.visit(tree)
+        context.results[self.name] = eliminator.eliminated
+
+
+class PassManager(object):
+    """Runs the passes selected by an optimization level (-O0, -O1, -O2).
+
+    Consecutive analysis passes are fused into a single tree walk. Time
+    spent in every pass is recorded in ``context.timings``.
+    """
+
+    def __init__(self, opt_level: int = DEFAULT_OPT_LEVEL, passes=None,
+                 metrics=None, modules=None):
+        self.opt_level = opt_level
+        self.passes = list(passes) if passes is not None else default_passes()
+        self.metrics = metrics
+        self.modules = modules
+        self.context: Union[PassContext, None] = None
+
+    def add(self, pass_: Pass):
+        self.passes.append(pass_)
+        return pass_
+
+    def schedule(self):
+        scheduled = []
+        fused = []
+        for pass_ in self.passes:
+            if pass_.min_level > self.opt_level:
+                continue
+            if getattr(pass_, 'fusable', False):
+                fused.append(pass_)
+                continue
+            if fused:
+                scheduled.append(FusedWalk(fused))
+                fused = []
+            scheduled.append(pass_)
+        if fused:
+            scheduled.append(FusedWalk(fused))
+        return scheduled
+
+    def run(self, tree: ast.Module) -> ast.Module:
+        self.context = PassContext(self.opt_level, self.metrics,
+                                   self.modules)
+        for pass_ in self.schedule():
+            start = time.perf_counter()
+            result = pass_.run(tree, self.context)
+            if isinstance(result, ast.Module):
+                tree = result
+            if not isinstance(pass_, FusedWalk):
+                self.context.timings.append(
+                    (pass_.name, time.perf_counter() - start))
+        if self.metrics is not None:
+            for name, seconds in self.context.timings:
+                self.metrics.observe('phase_duration_seconds', seconds,
+                                     phase=name)
+        return tree
+
+    def report(self) -> str:
+        lines = [f'PASSES (-O{self.opt_level})']
+        total = 0.0
+        for name, seconds in self.context.timings:
+            total += seconds
+            lines.append(f'{name:<30}: {seconds * 1000:9.3f} ms')
+        lines.append(f'{"total":<30}: {total * 1000:9.3f} ms')
+        for name, result in self.context.results.items():
+            # Number of nodes changed by transformations.
+            if isinstance(result, int):
+                lines.append(f'{name:<30}: {result:9d} changed')
+        return '\n'.join(lines)
+
+
+def default_passes():
+    return [
+        SemanticAnalysisPass(),
+        NodeStatisticsPass(),
+        CallGraphPass(),
+        ConstantFoldingPass(),
+        DeadCodeEliminationPass(),
+        CommonSubexpressionEliminationPass(),
+    ]
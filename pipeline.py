@@ -0,0 +1,70 @@
+import ast
+from typing import Any, Union
+
+from analyzer import SemanticAnalyzer
+from containers import ActivationRecord
+from dupa_parser import Parser
+from interpreter import Interpreter
+from modules import ModuleBuilder
+from natives import BuiltinRegistry
+
+
+class StreamingPipeline(object):
+    """Runs a program one top-level statement at a time.
+
+    Every statement is analyzed against the global scope built so far and
+    executed in the global activation record as soon as the parser has
+    completed it, then dropped. Only function definitions, the global scope
+    and the globals stay in memory, however long the program is. Statements
+    are not optimized, the passes need the whole tree. A statement failing
+    analysis leaves the global scope as it was.
+    """
+
+    def __init__(self, builtins: BuiltinRegistry = None, metrics=None,
+                 builder: Union[ModuleBuilder, None] = None, tiering=None):
+        self.metrics = metrics
+        self.builder = builder
+        self.analyzer = SemanticAnalyzer(builtins, metrics=metrics)
+        self.interpreter = Interpreter(None, tiering=tiering, metrics=metrics)
+        self.global_scope = self.analyzer.enter_global_scope()
+        self.globals = self.interpreter.enter_program()
+        self.statements = 0
+
+    def execute(self, node: ast.stmt) -> Any:
+        """Analyze and execute one top-level statement, returns its value."""
+        if isinstance(node, ast.Import) and self.builder is not None:
+            names = [alias.name for alias in node.names
+                     if alias.name not in self.analyzer.modules]
+            if names:
+                self.analyzer.modules.update(self.builder.build(names))
+        self.global_scope.journal = journal = []
+        try:
+            self.analyzer.visit(node)
+        except Exception:
+            self.global_scope.undo(journal)
+            self.analyzer.current_scope = self.global_scope
+            raise
+        finally:
+            self.global_scope.journal = None
+        value = self.interpreter.visit(node)
+        self.statements += 1
+        if self.metrics is not None:
+            self.metrics.inc('statements_streamed')
+        return value
+
+    def recover(self):
+        """Return to the top level after a statement failed to execute."""
+        del self.interpreter.call_stack.items[1:]
+        self.interpreter.rebuild_display()
+        self.interpreter.current_proc = None
+
+    def run(self, parser: Parser) -> ActivationRecord:
+        """Execute the statements of ``parser`` as they are parsed."""
+        for node in parser.iter_program():
+            self.execute(node)
+        return self.globals
+
+    def close(self) -> ActivationRecord:
+        self.analyzer.leave_global_scope()
+        self.interpreter.leave_program()
+        return self.globals
@@ -0,0 +1,108 @@
+import ast
+import types
+from typing import Any
+
+from containers import ActivationRecord
+from enums import ARType
+from dupa_parser import Parser
+from interpreter import Interpreter
+from lexer import Lexer
+from modules import ModuleBuilder, find_imports
+from passes import PassManager, DEFAULT_OPT_LEVEL
+
+
+class CompiledProgram(object):
+    """Analyzed and optimized program, shareable between threads.
+
+    Everything which analysis writes into the tree, like the symbols of
+    called functions, is written before the program is created and never
+    after, so any number of ExecutionContexts may run it concurrently.
+    Attributes cannot be reassigned and ``functions`` is read-only. The
+    one exception are lazily parsed function bodies, which are parsed on
+    the first call under a lock, see ``lazy.materialize``.
+    """
+    __slots__ = ('tree', 'functions', 'opt_level')
+
+    def __init__(self, tree: ast.Module, functions,
+                 opt_level: int = DEFAULT_OPT_LEVEL):
+        object.__setattr__(self, 'tree', tree)
+        object.__setattr__(self, 'functions',
+                           types.MappingProxyType(dict(functions)))
+        object.__setattr__(self, 'opt_level', opt_level)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    @classmethod
+    def compile(cls, text: str, opt_level: int = DEFAULT_OPT_LEVEL,
+                builder: ModuleBuilder = None,
+                lazy_functions: bool = False,
+                hash_cons: bool = False) -> 'CompiledProgram':
+        modules = None
+        imports = find_imports(text)
+        if imports:
+            if builder is None:
+                builder = ModuleBuilder(opt_level=opt_level)
+            modules = builder.build(imports)
+        tree = Parser(Lexer(text), lazy_functions=lazy_functions,
+                      hash_cons=hash_cons).parse()
+        pass_manager = PassManager(opt_level, modules=modules)
+        tree = pass_manager.run(tree)
+        global_scope = pass_manager.context.global_scope
+        functions = {
+            symbol.name: symbol for symbol in global_scope.procedures()
+            if symbol.body is not None
+        }
+        return cls(tree, functions, opt_level)
+
+    def context(self, tiering=None, metrics=None) -> 'ExecutionContext':
+        return ExecutionContext(self, tiering=tiering, metrics=metrics)
+
+    def run(self) -> ActivationRecord:
+        """Execute the program in a new context, returns its globals."""
+        return self.context().run()
+
+    def call(self, function: str, *args) -> Any:
+        """Call one function of the program in a new context."""
+        return self.context().call_function(function, *args)
+
+
+class ExecutionContext(Interpreter):
+    """State of one execution of a CompiledProgram.
+
+    The call stack, frame pool and current procedure live here, contexts
+    share nothing but the program and, when given, tiering and metrics.
+    A context is used by one thread at a time. Functions called directly
+    see the globals of the last run of the context, or none before it.
+    """
+
+    def __init__(self, program: CompiledProgram, tiering=None, metrics=None):
+        super(ExecutionContext, self).__init__(None, tiering=tiering,
+                                               metrics=metrics)
+        self.program = program
+        self.globals = ActivationRecord(name='program',
+                                        type_of=ARType.PROGRAM,
+                                        nesting_level=1)
+
+    def run(self) -> ActivationRecord:
+        self.globals = self.visit(self.program.tree)
+        return self.globals
+
+    def call_function(self, function: str, *args) -> Any:
+        try:
+            proc_symbol = self.program.functions[function]
+        except KeyError:
+            raise NameError(f'Function {function!r} not found') from None
+        if len(args) != len(proc_symbol.params):
+            raise TypeError(f'{function}() takes {len(proc_symbol.params)} '
+                            f'arguments, {len(args)} given')
+        self.enter_frame(self.globals)
+        try:
+            return self.call(proc_symbol, list(args))
+        finally:
+            # Frames of a failed call are left on the stack.
+            del self.call_stack.items[:]
+            self.rebuild_display()
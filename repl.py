@@ -0,0 +1,95 @@
+import ast
+import contextlib
+import os
+import sys
+from typing import TextIO, Union
+
+from dupa_parser import Parser
+from lexer import Lexer
+from modules import ModuleBuilder
+from nodes import DupaCall
+from pipeline import StreamingPipeline
+
+PROMPT = 'dupa> '
+CONTINUATION_PROMPT = '...   '
+
+
+def is_complete(text: str) -> bool:
+    """Whether a snippet ends a statement and closes all of its brackets."""
+    return text.rstrip().endswith((';', '}')) \
+        and text.count('{') <= text.count('}') \
+        and text.count('(') <= text.count(')')
+
+
+class Repl(object):
+    """Interactive session running snippets in one StreamingPipeline.
+
+    Every snippet is lexed, parsed and analyzed on its own against the
+    persistent global scope and executed in the persistent globals, so the
+    work per snippet does not grow with the session. Assignments to globals
+    and calls returning a value are echoed, the interpreter's trace goes to
+    ``trace``, discarded if not given.
+    """
+
+    def __init__(self, builder: Union[ModuleBuilder, None] = None,
+                 metrics=None, output: Union[TextIO, None] = None,
+                 trace: Union[TextIO, None] = None):
+        self.output = output if output is not None else sys.stdout
+        self._devnull = None
+        if trace is None:
+            trace = self._devnull = open(os.devnull, 'w')
+        self.trace = trace
+        self.lines = []
+        with contextlib.redirect_stdout(self.trace):
+            self.pipeline = StreamingPipeline(metrics=metrics,
+                                              builder=builder)
+
+    def feed(self, line: str) -> bool:
+        """Add a line of input, True when it completed a snippet."""
+        self.lines.append(line)
+        snippet = ''.join(self.lines)
+        if snippet.strip() and not is_complete(snippet):
+            return False
+        self.lines = []
+        if snippet.strip():
+            self.run(snippet)
+        return True
+
+    def run(self, snippet: str):
+        with contextlib.redirect_stdout(self.trace):
+            try:
+                for node in Parser(Lexer(snippet)).iter_program():
+                    self.echo(node, self.pipeline.execute(node))
+            except Exception as e:
+                self.pipeline.recover()
+                print(f'{e.__class__.__name__}: {e}', file=self.output)
+
+    def echo(self, node: ast.stmt, value):
+        if isinstance(node, ast.Assign) and \
+                isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+            print(f'{name} = {self.pipeline.globals[name]}',
+                  file=self.output)
+        elif isinstance(node, DupaCall) and value is not None:
+            print(value, file=self.output)
+
+    def interact(self):
+        """Read lines from stdin until end of input."""
+        while True:
+            try:
+                line = input(CONTINUATION_PROMPT if self.lines else PROMPT)
+            except EOFError:
+                print(file=self.output)
+                break
+            except KeyboardInterrupt:
+                # Drops the unfinished snippet.
+                self.lines = []
+                print(file=self.output)
+                continue
+            self.feed(line + '\n')
+
+    def close(self):
+        with contextlib.redirect_stdout(self.trace):
+            self.pipeline.close()
+        if self._devnull is not None:
+            self._devnull.close()
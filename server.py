@@ -0,0 +1,245 @@
+import argparse
+import array
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union
+
+from errors import PreInterpretError
+from passes import DEFAULT_OPT_LEVEL
+from program import CompiledProgram
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_SIZE = 256
+# Longest request or response line in bytes, asyncio's default is 64 KiB.
+MAX_LINE = 16 * 1024 * 1024
+
+
+class ProgramCache(object):
+    """LRU cache of compiled programs keyed by source hash."""
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._programs = OrderedDict()
+
+    def __len__(self):
+        return len(self._programs)
+
+    def get(self, key: str):
+        program = self._programs.get(key)
+        if program is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._programs.move_to_end(key)
+        return program
+
+    def put(self, key: str, program):
+        self._programs[key] = program
+        self._programs.move_to_end(key)
+        while len(self._programs) > self.max_size:
+            self._programs.popitem(last=False)
+
+
+def source_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def compile_source(text: str,
+                   opt_level: int = DEFAULT_OPT_LEVEL) -> CompiledProgram:
+    return CompiledProgram.compile(text, opt_level)
+
+
+def to_json_value(value):
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    if isinstance(value, array.array):
+        return value.tolist()
+    return repr(value)
+
+
+# Per worker process state, set up by _init_worker.
+_worker_cache: Union[ProgramCache, None] = None
+_devnull = None
+
+
+def _init_worker(cache_size: int):
+    global _worker_cache, _devnull
+    _worker_cache = ProgramCache(cache_size)
+    _devnull = open(os.devnull, 'w')
+
+
+def run_source(key: str, text: str) -> dict:
+    # The front end and the interpreter trace to stdout, keep it out of
+    # the worker's terminal.
+    with contextlib.redirect_stdout(_devnull):
+        try:
+            program = _worker_cache.get(key)
+            cached = program is not None
+            if not cached:
+                program = compile_source(text)
+                _worker_cache.put(key, program)
+            ar = program.run()
+        except PreInterpretError as e:
+            return {
+                'ok': False,
+                'error': {
+                    'type': e.__class__.__name__,
+                    'code': e.error_code.value if e.error_code else None,
+                    'message': str(e),
+                },
+            }
+        except Exception as e:
+            return {
+                'ok': False,
+                'error': {'type': e.__class__.__name__, 'code': None,
+                          'message': str(e)},
+            }
+    return {
+        'ok': True,
+        'cached': cached,
+        'globals': {name: to_json_value(value)
+                    for name, value in ar.members.items()},
+    }
+
+
+class DupaServer(object):
+    """Long running compile-and-run server.
+
+    Requests and responses are newline delimited JSON objects. A request
+    carries the program in ``source`` and an optional ``id`` which is echoed
+    back in the response. Execution happens in a process pool so the event
+    loop only does I/O. Requests longer than ``max_line`` bytes are skipped
+    and answered with an error.
+    """
+
+    def __init__(self, workers: int = None,
+                 cache_size: int = DEFAULT_CACHE_SIZE,
+                 max_line: int = MAX_LINE):
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_size = cache_size
+        self.max_line = max_line
+        self.requests = 0
+        self._pool: Union[ProcessPoolExecutor, None] = None
+        self._server: Union[asyncio.AbstractServer, None] = None
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                    path: str = None):
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.cache_size,),
+        )
+        if path is not None:
+            self._server = await asyncio.start_unix_server(
+                self.handle, path=path, limit=self.max_line)
+        else:
+            self._server = await asyncio.start_server(
+                self.handle, host, port, limit=self.max_line)
+        return self._server
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    async def execute(self, text: str) -> dict:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, run_source,
+                                          source_hash(text), text)
+
+    @staticmethod
+    async def read_request(reader: asyncio.StreamReader) -> bytes:
+        """Next request line, empty at the end of the connection.
+
+        Raises ValueError for a line over the reader's limit, after skipping
+        it, so the following requests are read intact.
+        """
+        try:
+            return await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+        while True:
+            await reader.readexactly(consumed)
+            try:
+                await reader.readuntil(b'\n')
+                break
+            except asyncio.IncompleteReadError:
+                break
+            except asyncio.LimitOverrunError as e:
+                consumed = e.consumed
+        raise ValueError('request longer than the line limit')
+
+    async def handle(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    line = await self.read_request(reader)
+                    if not line:
+                        break
+                    request = json.loads(line)
+                    text = request['source']
+                except (ValueError, KeyError, TypeError) as e:
+                    response = {'ok': False,
+                                'error': {'type': 'BadRequest', 'code': None,
+                                          'message': str(e)}}
+                    request = {}
+                else:
+                    response = await self.execute(text)
+                self.requests += 1
+                if 'id' in request:
+                    response['id'] = request['id']
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='DUPA execution server')
+    arg_parser.add_argument('--host', default=DEFAULT_HOST)
+    arg_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    arg_parser.add_argument('--unix', metavar='PATH',
+                            help='listen on a unix socket instead of TCP')
+    arg_parser.add_argument('--workers', type=int, default=None)
+    arg_parser.add_argument('--cache-size', type=int,
+                            default=DEFAULT_CACHE_SIZE)
+    args = arg_parser.parse_args()
+
+    async def serve():
+        server = DupaServer(workers=args.workers, cache_size=args.cache_size)
+        await server.start(args.host, args.port, args.unix)
+        where = args.unix or f'{args.host}:{args.port}'
+        print(f'DUPA server listening on {where} '
+              f'with {server.workers} workers')
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
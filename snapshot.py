@@ -0,0 +1,89 @@
+import ast
+import pickle
+from typing import Union
+
+from arrays import copy_arrays
+from containers import ActivationRecord
+from dupa_collections import CallStack
+from interpreter import Interpreter
+
+
+class Snapshot(object):
+    """State of an interpreter paused between two top-level statements.
+
+    ``position`` is the index of the first top-level statement which has not
+    been executed yet. Captured frames are never written to, restoring forks
+    them so one snapshot can be resumed any number of times.
+    """
+
+    def __init__(self, tree: ast.Module, position: int, frames):
+        self.tree = tree
+        self.position = position
+        self.frames = frames
+
+    @classmethod
+    def capture(cls, interpreter: Interpreter, tree: ast.Module,
+                position: int) -> 'Snapshot':
+        frames = []
+        memo = {}
+        for ar in interpreter.call_stack.items:
+            frozen = ActivationRecord(ar.name, ar.type, ar.nesting_level)
+            frozen.members = copy_arrays(ar.members, memo)
+            frozen.return_value = ar.return_value
+            frames.append(frozen)
+        return cls(tree, position, frames)
+
+    def restore(self, interpreter: Interpreter = None) -> Interpreter:
+        if interpreter is None:
+            interpreter = Interpreter(None)
+        interpreter.call_stack = CallStack()
+        memo = {}
+        for frame in self.frames:
+            ar = frame.fork()
+            # Scalars are shared until written, arrays are written in place
+            # and have to be copied for every restore.
+            ar.members.maps[0].update(
+                (name, value) for name, value in
+                copy_arrays(frame.members, memo).items()
+                if value is not frame.members[name])
+            interpreter.call_stack.push(ar)
+        interpreter.rebuild_display()
+        return interpreter
+
+    def resume(self, interpreter: Interpreter = None) -> ActivationRecord:
+        """Restore the snapshot and run the remaining top-level statements."""
+        interpreter = self.restore(interpreter)
+        for child in self.tree.body[self.position:]:
+            interpreter.visit(child)
+        return interpreter.call_stack.pop()
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> 'Snapshot':
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+        if not isinstance(snapshot, cls):
+            raise TypeError(f'{path} does not contain a {cls.__name__}')
+        return snapshot
+
+
+def checkpoint(tree: ast.Module, after: int,
+               interpreter: Union[Interpreter, None] = None) -> Snapshot:
+    """Execute top-level statements up to and including ``after``.
+
+    ``tree`` has to be analyzed already. Negative indexes count from the end
+    of the program like for lists.
+    """
+    if after < 0:
+        after += len(tree.body)
+    if not 0 <= after < len(tree.body):
+        raise IndexError(f'program has no top-level statement {after}')
+    if interpreter is None:
+        interpreter = Interpreter(None)
+    interpreter.enter_program()
+    for child in tree.body[:after + 1]:
+        interpreter.visit(child)
+    return Snapshot.capture(interpreter, tree, after + 1)
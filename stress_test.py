@@ -0,0 +1,125 @@
+import argparse
+import contextlib
+import os
+import sys
+import threading
+import time
+
+from jit import TieredExecution
+from program import CompiledProgram
+
+PROGRAM = """
+def int fib(int n)
+{
+    if (n)
+    {
+        if (n - 1)
+        {
+            return fib(n - 1) + fib(n - 2);
+        }
+        return 1;
+    }
+    return 0;
+}
+
+def int weighted(int seed, int n)
+{
+    int[n] values;
+    int i;
+    int total;
+    for (i = 0; n - i; i = i + 1)
+    {
+        values[i] = seed * i;
+    }
+    for (i = 0; n - i; i = i + 1)
+    {
+        total = total + values[i];
+    }
+    return total;
+}
+
+int result;
+result = fib(12) + weighted(3, 10);
+"""
+
+FIBONACCI = [0, 1]
+while len(FIBONACCI) < 20:
+    FIBONACCI.append(FIBONACCI[-1] + FIBONACCI[-2])
+
+
+def worker(program: CompiledProgram, index: int, iterations: int, tiering,
+           failures: list, counts: list):
+    calls = 0
+    for k in range(iterations):
+        seed = index * iterations + k
+        n = k % 50 + 1
+        context = program.context(tiering=tiering)
+        checks = [
+            (f'weighted({seed}, {n})',
+             context.call_function('weighted', seed, n),
+             seed * n * (n - 1) // 2),
+            (f'fib({k % 15})', context.call_function('fib', k % 15),
+             FIBONACCI[k % 15]),
+        ]
+        if k % 10 == 0:
+            checks.append(('result', program.context(tiering=tiering).run()
+                           ['result'], FIBONACCI[12] + 3 * 45))
+        for name, got, expected in checks:
+            if got != expected:
+                failures.append(f'thread {index}: {name} = {got}, '
+                                f'expected {expected}')
+        calls += len(checks)
+    counts[index] = calls
+
+
+def stress(threads: int, iterations: int, tiered: bool) -> int:
+    program = CompiledProgram.compile(PROGRAM)
+    tiering = TieredExecution(threshold=100) if tiered else None
+    failures = []
+    counts = [0] * threads
+    workers = [
+        threading.Thread(target=worker, args=(program, index, iterations,
+                                              tiering, failures, counts))
+        for index in range(threads)
+    ]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if tiering is not None:
+        tiering.shutdown()
+
+    calls = sum(counts)
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print(f'threads           : {threads} (GIL {"on" if gil else "off"})',
+          file=sys.stderr)
+    print(f'calls             : {calls}', file=sys.stderr)
+    print(f'calls/s           : {calls / elapsed:.1f}', file=sys.stderr)
+    if tiering is not None:
+        print(f'tiering           : {tiering.stats}', file=sys.stderr)
+    print(f'mismatches        : {len(failures)}', file=sys.stderr)
+    for failure in failures[:10]:
+        print(f'  {failure}', file=sys.stderr)
+    return 1 if failures else 0
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Run one compiled program from many threads at once and '
+                    'check that executions do not see each other')
+    arg_parser.add_argument('--threads', type=int, default=8)
+    arg_parser.add_argument('--iterations', type=int, default=200)
+    arg_parser.add_argument('--tiering', action='store_true',
+                            help='share one tiered JIT between the threads')
+    args = arg_parser.parse_args()
+    # The interpreter traces to stdout.
+    with open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull):
+        status = stress(args.threads, args.iterations, args.tiering)
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,11 @@ from typing import Union
 
 from enums import VariableTypes
 
+ARRAY_TYPE_NAMES = (
+    str(VariableTypes.INTEGER_ARRAY),
+    str(VariableTypes.FLOAT_ARRAY),
+)
+
 
 class Symbol(object):
     def __init__(self, name: str, symbol_type=None):
@@ -38,6 +43,10 @@ class ProcedureSymbol(Symbol):
         self.params = params if params is not None else []
         self.body = body_ast
         self.returns = returns
+        # Names of parameters and local variables, sizes the frames.
+        self.local_names = [param.name for param in self.params]
+        # Name of the imported module defining the procedure.
+        self.module = None
 
     def __str__(self):
         return f'<{self.__class__.__name__}(name={self.name}, parameters={self.params})>'
@@ -46,19 +55,55 @@ class ProcedureSymbol(Symbol):
         return self.__str__()
 
 
+class NativeProcedureSymbol(ProcedureSymbol):
+    """Function implemented in Python and called directly by the interpreter.
+
+    Array arguments are handed over as ``memoryview``s of their buffers,
+    without copying, so the callable can also pass them on to native code.
+    """
+
+    def __init__(self, name, function, params=None, returns=None):
+        super(NativeProcedureSymbol, self).__init__(name, params=params,
+                                                    returns=returns)
+        self.function = function
+        self._views = tuple(
+            param.type is not None and param.type.name in ARRAY_TYPE_NAMES
+            for param in self.params
+        )
+
+    def invoke(self, arguments):
+        result = self.function(*[
+            memoryview(argument) if view else argument
+            for view, argument in zip(self._views, arguments)
+        ])
+        if self.returns == VariableTypes.INTEGER:
+            return int(result)
+        if self.returns == VariableTypes.FLOAT:
+            return float(result)
+        if self.returns is None:
+            return None
+        return result
+
+
 class ScopedSymbolTable(object):
     def __init__(self, scope_name: str, scope_level: int,
-                 enclosing_scope: Union['ScopedSymbolTable', None] = None):
+                 enclosing_scope: Union['ScopedSymbolTable', None] = None,
+                 metrics=None):
         self._symbols = {}
         self.scope_name = scope_name
         self.scope_level = scope_level
         self.enclosing_scope = enclosing_scope
+        self.metrics = metrics
+        # (name, replaced symbol) of every definition while not None.
+        self.journal = None
         self._init_builtins()
 
     def _init_builtins(self):
         self.define(BuiltinTypeSymbol(str(VariableTypes.UNIVERSAL)))
         self.define(BuiltinTypeSymbol(str(VariableTypes.FLOAT)))
         self.define(BuiltinTypeSymbol(str(VariableTypes.INTEGER)))
+        self.define(BuiltinTypeSymbol(str(VariableTypes.INTEGER_ARRAY)))
+        self.define(BuiltinTypeSymbol(str(VariableTypes.FLOAT_ARRAY)))
 
     def __str__(self):
         h1 = 'SCOPE (SCOPED SYMBOL TABLE)'
@@ -83,13 +128,46 @@ class ScopedSymbolTable(object):
     def __repr__(self):
         return self.__str__()
 
+    def variables(self):
+        return [symbol for symbol in self._symbols.values()
+                if isinstance(symbol, VarSymbol)]
+
+    def procedures(self):
+        return [symbol for symbol in self._symbols.values()
+                if isinstance(symbol, ProcedureSymbol)]
+
     def define(self, symbol: Symbol):
         print(f"Define: {symbol}")
+        if self.metrics is not None:
+            self.metrics.inc('symbols_defined')
         symbol.scope_level = self.scope_level
+        if self.journal is not None:
+            self.journal.append((symbol.name, self._symbols.get(symbol.name)))
         self._symbols[symbol.name] = symbol
 
+    def define_alias(self, symbol: Symbol):
+        """Make a symbol of another scope visible here, keeping its level.
+
+        Frames and display slots of a procedure follow its scope level, an
+        imported procedure stays at the level of its module.
+        """
+        print(f"Alias: {symbol}")
+        if self.journal is not None:
+            self.journal.append((symbol.name, self._symbols.get(symbol.name)))
+        self._symbols[symbol.name] = symbol
+
+    def undo(self, journal):
+        """Revert the definitions recorded in ``journal``."""
+        for name, previous in reversed(journal):
+            if previous is None:
+                del self._symbols[name]
+            else:
+                self._symbols[name] = previous
+
     def lookup(self, name: str, current_scope_only: bool = False):
         print(f"Lookup: {name}")
+        if self.metrics is not None:
+            self.metrics.inc('symbols_looked_up')
         symbol = self._symbols.get(name)
         if symbol is not None:
             return symbol
@@ -0,0 +1,161 @@
+import pytest
+
+from jit import TieredExecution
+from program import CompiledProgram
+
+LOOPS = """
+def int forLoop(int n)
+{
+    int i;
+    int total;
+    for (i = 0; n - i; i = i + 1)
+    {
+        if (i - 3) {} else { continue; }
+        if (i - 7) {} else { break; }
+        total = total + i;
+    }
+    return total;
+}
+
+def int forBreak(int n)
+{
+    int i;
+    int total;
+    for (i = 0; n - i; i = i + 1)
+    {
+        if (i - 7) {} else { break; }
+        total = total + i;
+    }
+    return total;
+}
+
+def int whileLoop(int n)
+{
+    int i;
+    int total;
+    while (n - i)
+    {
+        i = i + 1;
+        if (i - 3) {} else { continue; }
+        if (i - 7) {} else { break; }
+        total = total + i;
+    }
+    return total;
+}
+
+def int doWhileLoop(int n)
+{
+    int i;
+    int total;
+    do
+    {
+        i = i + 1;
+        if (i - 3) {} else { continue; }
+        if (i - 7) {} else { break; }
+        total = total + i;
+    } while (n - i);
+    return total;
+}
+
+def int doWhileBreak(int n)
+{
+    int i;
+    int total;
+    do
+    {
+        i = i + 1;
+        if (i - 7) {} else { break; }
+        total = total + i;
+    } while (n - i);
+    return total;
+}
+"""
+
+SCALE = """
+def var scale(var x)
+{
+    return x * 2;
+}
+"""
+
+ENCLOSING = """
+int counter;
+int i;
+int result;
+
+def bump(int k)
+{
+    counter = counter + k;
+}
+
+def int outer(int n)
+{
+    int acc;
+    int j;
+    def add(int k)
+    {
+        acc = acc + k;
+    }
+    for (j = 0; n - j; j = j + 1)
+    {
+        add(j);
+    }
+    return acc;
+}
+
+for (i = 0; 20 - i; i = i + 1)
+{
+    bump(i);
+}
+result = outer(20) + outer(10);
+"""
+
+
+def tiered(program: CompiledProgram):
+    tiering = TieredExecution(threshold=3, background=False)
+    return tiering, program.context(tiering=tiering)
+
+
+@pytest.mark.parametrize('function, compiled, expected', [
+    # The compiler keeps for and do-while loops with continue interpreted.
+    ('forLoop', False, 18),
+    ('forBreak', True, 21),
+    ('whileLoop', True, 18),
+    ('doWhileLoop', False, 18),
+    ('doWhileBreak', True, 21),
+])
+def test_break_and_continue(function, compiled, expected):
+    program = CompiledProgram.compile(LOOPS)
+    tiering, context = tiered(program)
+    for n in range(12):
+        assert context.call_function(function, n) == \
+            program.call(function, n)
+    assert context.call_function(function, 10) == expected
+    assert (tiering.stats['compiled_calls'] > 0) == compiled
+    symbol = program.functions[function]
+    assert (symbol in tiering.not_compilable) == (not compiled)
+
+
+def test_deoptimization_on_type_change():
+    program = CompiledProgram.compile(SCALE)
+    tiering, context = tiered(program)
+    for n in range(5):
+        assert context.call_function('scale', n) == 2 * n
+    assert tiering.stats['compiled'] == 1
+    assert context.call_function('scale', 1.5) == 3.0
+    assert tiering.stats['deoptimizations'] == 1
+    for n in range(5):
+        assert context.call_function('scale', n + 0.5) == 2 * n + 1.0
+    assert tiering.stats['compiled'] == 2
+    assert context.call_function('scale', 4) == 8
+    assert tiering.stats['deoptimizations'] == 1
+
+
+def test_writes_to_enclosing_scopes():
+    program = CompiledProgram.compile(ENCLOSING)
+    tiering, context = tiered(program)
+    result = context.run()
+    assert tiering.stats['compiled_calls'] > 0
+    assert result['counter'] == 190
+    assert result['result'] == 190 + 45
+    assert program.run()['result'] == 190 + 45
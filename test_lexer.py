@@ -0,0 +1,11 @@
+from enums import TokenType
+from lexer import Lexer
+
+
+def test_tracing_does_not_compute_positions(capsys):
+    lexer = Lexer('int x;\nx = 1 + 2;\n')
+    while lexer.get_next_token().token_type != TokenType.EOF:
+        pass
+    assert 'offset=' in capsys.readouterr().out
+    # The line index is only built when a position is asked for.
+    assert lexer.source_index._line_starts is None
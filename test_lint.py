@@ -0,0 +1,36 @@
+from errors import LexerError, ParserError, SemanticError
+from lint import lint, position
+
+PROGRAM = """int x;
+x = 1 + ;
+x = 2 $ 3;
+y = 4;
+"""
+
+
+def test_every_error_has_a_position():
+    errors = lint(PROGRAM)
+    assert [(error.__class__, position(error)) for error in errors] == [
+        (ParserError, '2:9'),
+        (LexerError, '3:7'),
+        (SemanticError, '4'),
+    ]
+
+
+def test_recovery_after_a_bad_character_following_a_statement():
+    errors = lint('{ x = 1; }$ int y; y = 2;\nint z; z = 1;$ z = 2;\n')
+    assert [(error.__class__, position(error)) for error in errors] == [
+        (LexerError, '1:11'),
+        (LexerError, '2:14'),
+    ]
+
+
+def test_bad_characters_in_a_row():
+    errors = lint('int y; { y = 1; }$$ y = 2;')
+    assert [position(error) for error in errors] == ['1:18', '1:19']
+
+
+def test_error_at_the_end_is_on_the_last_line():
+    for text in ('int x;\nx = 1 +', 'int x;\nx = 1 +\n', 'int x;\nx = 1 +\n\n'):
+        error, = lint(text)
+        assert position(error) == '2:7'
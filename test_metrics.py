@@ -0,0 +1,51 @@
+import sys
+import threading
+import time
+
+import parallel
+from metrics import Metrics
+
+
+def run_threads(target, count: int = 8):
+    barrier = threading.Barrier(count)
+
+    def start():
+        barrier.wait()
+        target()
+
+    threads = [threading.Thread(target=start) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_updates_are_not_lost():
+    metrics = Metrics()
+
+    def update():
+        for value in range(20000):
+            metrics.inc('calls')
+            metrics.set_max('call_stack_peak_depth', value)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        run_threads(update)
+    finally:
+        sys.setswitchinterval(interval)
+    assert metrics.counters['calls'] == 8 * 20000
+    assert metrics.gauges['call_stack_peak_depth'] == 19999
+
+
+def test_default_loops_is_created_once(monkeypatch):
+    class SlowLoops(parallel.ParallelLoops):
+        def __init__(self):
+            time.sleep(0.01)
+            super().__init__()
+
+    monkeypatch.setattr(parallel, 'ParallelLoops', SlowLoops)
+    monkeypatch.setattr(parallel, '_default_loops', None)
+    created = []
+    run_threads(lambda: created.append(parallel.default_loops()))
+    assert len({id(loops) for loops in created}) == 1
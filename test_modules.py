@@ -0,0 +1,45 @@
+from modules import ModuleBuilder
+from program import CompiledProgram
+
+SQUARE = """
+def int sq(int a)
+{
+    int t;
+    t = a * a;
+    return t;
+}
+"""
+
+
+def compile_with_square(tmp_path, text: str) -> CompiledProgram:
+    (tmp_path / 'm.dupa').write_text(SQUARE)
+    builder = ModuleBuilder(search_path=[str(tmp_path)], cache_dir=None,
+                            workers=1)
+    return CompiledProgram.compile(text, builder=builder)
+
+
+def test_import_at_top_level(tmp_path):
+    program = compile_with_square(tmp_path, """
+import m;
+def int f(int b)
+{
+    return sq(b) + b;
+}
+int r;
+r = f(3);
+""")
+    assert program.run()['r'] == 12
+
+
+def test_import_inside_function(tmp_path):
+    program = compile_with_square(tmp_path, """
+def int f(int b)
+{
+    import m;
+    return sq(b) + b;
+}
+int r;
+r = f(3);
+""")
+    assert program.run()['r'] == 12
+    assert program.call('f', 4) == 20
@@ -0,0 +1,50 @@
+import pytest
+
+from errors import SemanticError
+from program import CompiledProgram
+
+
+def test_variables_named_after_builtins():
+    result = CompiledProgram.compile("""
+int sum;
+int abs;
+sum = 3;
+abs = sum * 2;
+""").run()
+    assert result['sum'] == 3
+    assert result['abs'] == 6
+
+
+def test_builtins_stay_callable():
+    result = CompiledProgram.compile("""
+float[3] values;
+float total;
+int magnitude;
+values[0] = 3 / 2;
+values[2] = 4 / 2;
+total = sum(values);
+magnitude = abs(0 - 4);
+""").run()
+    assert result['total'] == 3.5
+    assert result['magnitude'] == 4
+
+
+def test_function_shadowing_builtin():
+    program = CompiledProgram.compile("""
+def int abs(int x)
+{
+    return x + 100;
+}
+int r;
+r = abs(1);
+""")
+    assert program.run()['r'] == 101
+
+
+def test_declaration_hides_builtin_in_its_scope():
+    with pytest.raises(SemanticError):
+        CompiledProgram.compile("""
+int abs;
+int r;
+r = abs(1);
+""")
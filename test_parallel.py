@@ -0,0 +1,140 @@
+import pytest
+
+from cooperative import run_programs
+from errors import SemanticError
+from parallel import ParallelLoops
+from program import CompiledProgram
+
+REDUCTIONS = """
+int s;
+int p;
+int i;
+int[500] squares;
+p = 1;
+parfor (i = 0, 500)
+{
+    int t;
+    t = i * i;
+    squares[i] = t;
+    s = s + t;
+    p = p * (i - i + 2);
+}
+"""
+
+GLOBAL_READ = """
+int k;
+int s;
+int i;
+k = 2;
+def int f(int i)
+{
+    return i * k;
+}
+parfor (i = 0, 20000)
+{
+    s = s + f(i);
+}
+"""
+
+GLOBAL_WRITE = """
+int g;
+int s;
+int i;
+def int f(int i)
+{
+    g = g + 1;
+    return i;
+}
+parfor (i = 0, 100)
+{
+    s = s + f(i);
+}
+"""
+
+
+def run(text: str, workers: int):
+    program = CompiledProgram.compile(text)
+    loops = ParallelLoops(workers=workers, min_iterations=100)
+    context = program.context()
+    context.parallel = loops
+    try:
+        return context.run(), loops.stats
+    finally:
+        loops.shutdown()
+
+
+def test_callee_reading_global():
+    serial, serial_stats = run(GLOBAL_READ, workers=1)
+    parallel, parallel_stats = run(GLOBAL_READ, workers=4)
+    assert serial['s'] == parallel['s'] == 399980000
+    assert serial_stats['serial_loops'] == 1
+    assert parallel_stats['parallel_loops'] == 1
+
+
+def test_callee_writing_global():
+    with pytest.raises(SemanticError):
+        CompiledProgram.compile(GLOBAL_WRITE)
+
+
+def members(ar) -> dict:
+    return {name: (list(value) if hasattr(value, 'tolist') else value)
+            for name, value in ar.members.items()}
+
+
+def test_reductions_and_written_arrays():
+    serial, serial_stats = run(REDUCTIONS, workers=1)
+    parallel, parallel_stats = run(REDUCTIONS, workers=3)
+    assert serial_stats['serial_loops'] == 1
+    assert parallel_stats['parallel_loops'] == 1
+    assert members(serial) == members(parallel)
+    assert serial['s'] == sum(i * i for i in range(500))
+    assert serial['p'] == 2 ** 500
+    assert list(serial['squares']) == [i * i for i in range(500)]
+    # Declared in the body, private to an iteration on both paths.
+    assert 't' not in serial.members
+
+
+def test_cooperative_runs_serially_and_yields():
+    program = CompiledProgram.compile(REDUCTIONS)
+    task, = run_programs([program.tree], step_interval=50).tasks
+    assert task.state == task.FINISHED
+    assert task.slices > 5
+    assert members(task.result) == members(run(REDUCTIONS, workers=1)[0])
+
+
+@pytest.mark.parametrize('body', [
+    's = s + 1; p = s;',
+    's = s - i;',
+    's = s + i; s = s * 2;',
+    'i = 1;',
+    'squares[i + 1] = 1;',
+    'p = squares[i - 1]; squares[i] = 1;',
+    'if (i) { break; }',
+])
+def test_dependencies_are_rejected(body):
+    with pytest.raises(SemanticError):
+        CompiledProgram.compile(f"""
+int s;
+int p;
+int i;
+int[10] squares;
+parfor (i = 0, 10)
+{{
+    {body}
+}}
+""")
+
+
+def test_private_variables_are_not_visible_after_the_loop():
+    with pytest.raises(SemanticError):
+        CompiledProgram.compile("""
+int s;
+int i;
+parfor (i = 0, 10)
+{
+    int t;
+    t = i;
+    s = s + t;
+}
+s = t;
+""")
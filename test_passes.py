@@ -0,0 +1,72 @@
+import ast
+
+from cooperative import run_programs
+from dupa_parser import Parser
+from lexer import Lexer
+from passes import PassManager, TEMPORARY_PREFIX
+from program import CompiledProgram
+
+GLOBALS = """
+int x;
+int a;
+int b;
+int c;
+x = 3;
+a = x * 7 + 1;
+b = x * 7 + 2;
+x = 1;
+c = x * 7 + 3;
+"""
+
+FUNCTION = """
+def int f(int p, int q)
+{
+    int r;
+    r = (p + q) * (p - q) + (p + q);
+    q = 0;
+    return r + (p + q) * 2;
+}
+int y;
+y = f(5, 2);
+"""
+
+
+def optimize(text: str, opt_level: int):
+    tree = Parser(Lexer(text)).parse()
+    pass_manager = PassManager(opt_level)
+    tree = pass_manager.run(tree)
+    return tree, pass_manager.context.results
+
+
+def temporaries(tree) -> set:
+    return {node.id for node in ast.walk(tree)
+            if isinstance(node, ast.Name)
+            and node.id.startswith(TEMPORARY_PREFIX)}
+
+
+def test_cse_rewrite_keeps_results():
+    for text, expected in ((GLOBALS, {'x': 1, 'a': 22, 'b': 23, 'c': 10}),
+                           (FUNCTION, {'y': 38})):
+        tree, results = optimize(text, 2)
+        assert results['common-subexpression-elimination'] > 0
+        assert temporaries(tree)
+        for opt_level in (0, 2):
+            result = CompiledProgram.compile(text, opt_level).run()
+            assert dict(result.members) == expected
+
+
+def test_cse_ends_at_assignment():
+    tree, _ = optimize(GLOBALS, 2)
+    # x * 7 is shared by a and b only, c reads the new x.
+    assert len(temporaries(tree)) == 1
+    c = [node for node in tree.body if isinstance(node, ast.Assign)
+         and node.targets[0].id == 'c'][0]
+    assert not temporaries(c)
+
+
+def test_temporaries_stay_hidden():
+    program = CompiledProgram.compile(GLOBALS, 2)
+    assert temporaries(program.tree)
+    assert set(program.run().members) == {'x', 'a', 'b', 'c'}
+    task, = run_programs([program.tree]).tasks
+    assert set(task.result.members) == {'x', 'a', 'b', 'c'}
@@ -0,0 +1,38 @@
+import asyncio
+import json
+
+from server import DupaServer
+
+
+async def exchange(lines, max_line: int):
+    server = DupaServer(workers=1, max_line=max_line)
+    listening = await server.start(port=0)
+    host, port = listening.sockets[0].getsockname()[:2]
+    try:
+        reader, writer = await asyncio.open_connection(host, port,
+                                                       limit=1 << 24)
+        writer.write(b''.join(json.dumps(line).encode('utf-8') + b'\n'
+                              for line in lines))
+        await writer.drain()
+        responses = [json.loads(await reader.readline()) for _ in lines]
+        writer.close()
+        return responses
+    finally:
+        await server.close()
+
+
+def test_request_over_the_line_limit():
+    too_long = {'id': 1, 'source': 'int x; ' * 20000}
+    following = {'id': 2, 'source': 'int x; x = 3;'}
+    first, second = asyncio.run(asyncio.wait_for(
+        exchange([too_long, following], max_line=100000), 60))
+    assert not first['ok'] and first['error']['type'] == 'BadRequest'
+    assert second == {'ok': True, 'cached': False, 'globals': {'x': 3},
+                      'id': 2}
+
+
+def test_request_over_the_asyncio_default_limit():
+    source = 'int x; x = 1;' + ' ' * 100000
+    response, = asyncio.run(asyncio.wait_for(
+        exchange([{'source': source}], max_line=1 << 20), 60))
+    assert response['globals'] == {'x': 1}
@@ -1,27 +1,114 @@
-from typing import Any
+import bisect
+from typing import Any, Union
 
 from enums import TokenType
 
 
+class SourceIndex(object):
+    """Line starts of a source text, maps offsets to line and column.
+
+    The index is built on the first lookup, lexing itself only tracks
+    offsets. Positions follow the lexer's counting: lines and columns start
+    at 1, and at the end of the text the column is that of the last
+    character, or 0 after a trailing newline.
+    """
+    __slots__ = ('text', '_line_starts', '_last_line')
+
+    def __init__(self, text: str):
+        self.text = text
+        self._line_starts = None
+        # Lookups mostly move forward through the text, the line of the
+        # previous one is tried before bisecting.
+        self._last_line = 1
+
+    def line_starts(self):
+        if self._line_starts is None:
+            starts = [0]
+            find = self.text.find
+            index = find('\n')
+            while index != -1:
+                starts.append(index + 1)
+                index = find('\n', index + 1)
+            self._line_starts = starts
+        return self._line_starts
+
+    def position(self, offset: int) -> (int, int):
+        starts = self.line_starts()
+        length = len(self.text)
+        if offset >= length:
+            if length and self.text[-1] == '\n':
+                return len(starts), 0
+            return len(starts), length - starts[-1]
+        lineno = self._last_line
+        if not (starts[lineno - 1] <= offset and (
+                lineno == len(starts) or offset < starts[lineno])):
+            lineno = self._last_line = bisect.bisect_right(starts, offset)
+        return lineno, offset - starts[lineno - 1] + 1
+
+
+class LineSource(object):
+    """Single line of a source text, used when lexing a stream.
+
+    Offsets are relative to the start of the line, past its end the column
+    is that of the last character like in SourceIndex.
+    """
+    __slots__ = ('lineno', 'text')
+
+    def __init__(self, lineno: int, text: str):
+        self.lineno = lineno
+        self.text = text
+
+    def position(self, offset: int) -> (int, int):
+        return self.lineno, min(offset + 1, len(self.text))
+
+
 class Token(object):
-    def __init__(self, token_type: TokenType, value: Any, lineno: int = None,
-                 column: int = None):
+    __slots__ = ('token_type', 'value', 'offset', 'source')
+
+    def __init__(self, token_type: TokenType, value: Any, offset: int = None,
+                 source: Union[SourceIndex, None] = None):
         self.token_type = token_type
         self.value = value
-        self.lineno = lineno
-        self.column = column
+        self.offset = offset
+        self.source = source
+
+    @property
+    def lineno(self):
+        if self.source is None or self.offset is None:
+            return None
+        return self.source.position(self.offset)[0]
+
+    @property
+    def column(self):
+        if self.source is None or self.offset is None:
+            return None
+        return self.source.position(self.offset)[1]
+
+    def position(self):
+        if self.source is None or self.offset is None:
+            return None, None
+        return self.source.position(self.offset)
 
     def __str__(self):
+        lineno, column = self.position()
         return 'Token({type}, {value}, position={lineno}:{column})'.format(
             type=self.token_type,
             value=repr(self.value),
-            lineno=self.lineno,
-            column=self.column
+            lineno=lineno,
+            column=column
         )
 
     def __repr__(self):
         return self.__str__()
 
+    def trace(self):
+        """Form printed while lexing, the offset is not mapped to a line."""
+        return 'Token({type}, {value}, offset={offset})'.format(
+            type=self.token_type,
+            value=repr(self.value),
+            offset=self.offset
+        )
+
 
 def build_reserved_keywords():
     tt_list = list(TokenType)
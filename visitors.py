@@ -0,0 +1,65 @@
+import ast
+
+import nodes
+
+
+def _node_types():
+    types = {}
+    for module in (ast, nodes):
+        for name, value in vars(module).items():
+            if isinstance(value, type) and issubclass(value, ast.AST):
+                types[name] = value
+    # ast.Num() builds ast.Constant nodes.
+    types['Num'] = ast.Constant
+    return types
+
+
+NODE_TYPES = _node_types()
+
+
+class DispatchVisitor(ast.NodeVisitor):
+    """NodeVisitor dispatching through a per-class node type -> method table.
+
+    ``ast.NodeVisitor.visit`` builds ``'visit_' + classname`` and calls
+    ``getattr`` for every node. Here the table is filled when the visitor
+    class is created, node types without a visitor are added on first use.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = {}
+        cls._tables = {'visit_': cls._dispatch}
+        for name in dir(cls):
+            if name.startswith('visit_') and name[6:] in NODE_TYPES:
+                cls.resolve(NODE_TYPES[name[6:]])
+
+    def visit(self, node):
+        try:
+            method = self._dispatch[node.__class__]
+        except KeyError:
+            method = self.resolve(node.__class__)
+        return method(self, node)
+
+    @classmethod
+    def resolve(cls, node_type, prefix: str = 'visit_', default=...):
+        method = getattr(cls, prefix + node_type.__name__, None)
+        if node_type is ast.Constant and (
+                method is None or method is ast.NodeVisitor.visit_Constant):
+            # Skip NodeVisitor.visit_Constant's deprecated indirection.
+            method = getattr(cls, prefix + 'Num', method)
+        if method is None:
+            method = cls.generic_visit if default is ... else default
+        cls._tables.setdefault(prefix, {})[node_type] = method
+        return method
+
+    @classmethod
+    def lookup(cls, node_type, prefix: str = 'visit_', default=...):
+        """Table lookup, also for method families other than ``visit_``.
+
+        Node types without a method map to ``default``, which is
+        ``generic_visit`` unless given.
+        """
+        try:
+            return cls._tables[prefix][node_type]
+        except KeyError:
+            return cls.resolve(node_type, prefix, default)